@@ -1,10 +1,6 @@
-import matplotlib
-matplotlib.use("qt4agg")
-import pylab as PL
 import random as RD
 import numpy as NP
 from scipy.spatial import distance as dist
-from sklearn import preprocessing
 #import evacuation
 
 class Agent:
@@ -166,4 +162,26 @@ class Agent:
         mag = float(NP.sqrt(x*x + y*y))
         newX = x/mag
         newY = y/mag
-        return [newX, newY]
\ No newline at end of file
+        return [newX, newY]
+
+def _flockField(array, axis):
+    """Property reading and writing one column of a Flock array"""
+    def get(self):
+        return float(getattr(self.flock, array)[self.index, axis])
+    def set(self, val):
+        getattr(self.flock, array)[self.index, axis] = val
+    return property(get, set)
+
+class AgentView(Agent):
+    """Agent whose fields are stored in row `index` of a flock.Flock"""
+    
+    posX = _flockField('pos', 0)
+    posY = _flockField('pos', 1)
+    oldVelX = _flockField('oldVel', 0)
+    oldVelY = _flockField('oldVel', 1)
+    newVelX = _flockField('newVel', 0)
+    newVelY = _flockField('newVel', 1)
+    
+    def __init__(self, flock, index):
+        self.flock = flock
+        self.index = index
@@ -0,0 +1,88 @@
+"""Compare the neighbor backends of neighbors.py on uniform and clustered flocks.
+
+Every backend is checked against the brute-force reference (up to
+--check-limit agents), then timed on one build plus the avoidanceRadius and
+flockRadius queries of a step. The output shows where the grid and
+KD-tree backends overtake brute force, and which one wins at each size.
+
+    python benchmarks/backends.py --sizes 64 256 1024 4096 16384
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as NP
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from neighbors import makeIndex
+
+avoidanceRadius = 30
+flockRadius = 100
+boardDimension = 1000
+
+def uniformFlock(n, rng):
+    return rng.uniform(0, boardDimension, (n, 2))
+
+def clusteredFlock(n, rng, clusters=8, spread=40.0):
+    """n agents in a few tight groups, as boids end up after flocking"""
+    centers = rng.uniform(0, boardDimension, (clusters, 2))
+    pos = centers[rng.integers(0, clusters, n)] + rng.normal(0, spread, (n, 2))
+    return pos % boardDimension
+
+layouts = {'uniform': uniformFlock, 'clustered': clusteredFlock}
+
+def stepQueries(index, pos):
+    """Neighbor work of one step: build, then query both radii"""
+    index.build(pos)
+    return index.query(avoidanceRadius), index.query(flockRadius)
+
+def samePairs(a, b, n):
+    """True if two (i, j, delta, d) results hold the same set of pairs"""
+    return NP.array_equal(NP.sort(a[0] * n + a[1]), NP.sort(b[0] * n + b[1]))
+
+def timeBackend(backend, pos, periodic, repeats):
+    index = makeIndex(backend, max(flockRadius, avoidanceRadius), boardDimension, periodic)
+    best = float('inf')
+    for r in range(repeats):
+        start = time.perf_counter()
+        stepQueries(index, pos)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 1024, 4096, 16384])
+    parser.add_argument('--backends', nargs='+', default=['brute', 'grid', 'kdtree'])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--check-limit', type=int, default=4096,
+                        help='largest flock checked against the brute-force backend')
+    parser.add_argument('--brute-limit', type=int, default=16384,
+                        help='largest flock timed with the brute-force backend')
+    parser.add_argument('--open', action='store_true', help='non-periodic board (evacuation) instead of wrap-around (boids)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    periodic = not args.open
+    rng = NP.random.default_rng(args.seed)
+    print('%-10s %8s ' % ('layout', 'agents') + ' '.join('%10s' % b for b in args.backends) + '  fastest')
+    for layout, makeFlock in sorted(layouts.items()):
+        for n in args.sizes:
+            pos = makeFlock(n, rng)
+            if n <= args.check_limit:
+                reference = stepQueries(makeIndex('brute', flockRadius, boardDimension, periodic), pos)
+                for backend in args.backends:
+                    result = stepQueries(makeIndex(backend, flockRadius, boardDimension, periodic), pos)
+                    for got, want in zip(result, reference):
+                        if not samePairs(got, want, n):
+                            raise SystemExit('%s backend disagrees with brute force (%s, %d agents)' % (backend, layout, n))
+            times = {}
+            for backend in args.backends:
+                if backend == 'brute' and n > args.brute_limit:
+                    continue
+                times[backend] = timeBackend(backend, pos, periodic, args.repeats)
+            cells = ' '.join('%9.2fms' % (times[b] * 1000) if b in times else '%10s' % '-' for b in args.backends)
+            print('%-10s %8d %s  %s' % (layout, n, cells, min(times, key=times.get)))
+
+if __name__ == '__main__':
+    main()
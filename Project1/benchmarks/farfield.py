@@ -0,0 +1,73 @@
+"""Check and time the Barnes-Hut far field of quadtree.py against exact flock sums.
+
+The boids model is initialized (and optionally stepped) at each size, so
+the flock includes agents boids.init places off the board; the quadtree
+sums are then compared with Flock.getFlock's exact ones. theta = 0 must
+match to rounding, otherwise the script fails; for the other thetas the
+median relative error of the summed location and the time per build and
+query are reported. boids.init stacks large populations on a lattice,
+the worst case for the far-field estimate; --layout uniform scatters the
+agents over the board instead.
+
+    python benchmarks/farfield.py --sizes 64 400 4096 --thetas 0 0.3 0.5 1
+    python benchmarks/farfield.py --layout uniform --sizes 4096 16384
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as NP
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import boids
+from quadtree import QuadTree
+
+def exactSums(size, steps, seed, layout='boids'):
+    """Flock of the boids model after `steps` steps and its exact getFlock sums"""
+    NP.random.seed(seed)
+    boids.RD.seed(seed)
+    boids.populationSize = size
+    boids.farField = False
+    boids.init()
+    if layout == 'uniform':
+        boids.flock.pos[:] = NP.random.uniform(0, boids.boardDimension, (size, 2))
+    for k in range(steps):
+        boids.step()
+    flock = boids.flock
+    flock.buildIndex()
+    avgLoc, avgVel = flock.getFlock(boids.flockRadius)
+    return flock.pos.copy(), flock.oldVel.copy(), avgLoc, avgVel
+
+def relativeError(approx, exact):
+    return NP.sqrt(((approx - exact) ** 2).sum(axis=1)) / NP.maximum(NP.sqrt((exact ** 2).sum(axis=1)), 1e-12)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 400, 4096])
+    parser.add_argument('--thetas', type=float, nargs='+', default=[0, 0.3, 0.5, 1.0])
+    parser.add_argument('--steps', type=int, default=0, help='boids steps before comparing')
+    parser.add_argument('--layout', choices=['boids', 'uniform'], default='boids',
+                        help='boids.init lattice, or agents scattered uniformly over the board')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    failed = False
+    print("%8s %6s %12s %12s %10s" % ('agents', 'theta', 'maxAbsError', 'medianRel', 'ms'))
+    for size in args.sizes:
+        pos, vel, avgLoc, avgVel = exactSums(size, args.steps, args.seed, args.layout)
+        for theta in args.thetas:
+            tree = QuadTree(boids.boardDimension, theta, periodic=True)
+            before = time.perf_counter()
+            tree.build(pos, vel)
+            loc, v = tree.flockSums(boids.flockRadius)
+            ms = (time.perf_counter() - before) * 1e3
+            maxAbs = max(NP.abs(loc - avgLoc).max(), NP.abs(v - avgVel).max())
+            print("%8d %6g %12.3g %12.3g %10.1f" % (size, theta, maxAbs, NP.median(relativeError(loc, avgLoc)), ms))
+            if theta == 0 and maxAbs > 1e-6 * max(NP.abs(avgLoc).max(), 1.0):
+                print("theta = 0 differs from the exact sums")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Scaling benchmark for the boids and evacuation models.
+
+Each (model, population) pair runs headless in a fresh process, so the
+reported peak memory (max RSS) belongs to that run alone. After one
+warm-up step a fixed number of steps is timed with a StepProfiler. The
+report gives steps per second, peak memory, and the share of step time
+spent in neighbor search (index build, collisions, getFlock) versus
+integration.
+
+Boids are spawned uniformly at the density of the default 64-agent run,
+with the board grown to fit, so every size measures the same crowd. The
+evacuation room has a fixed floor plan, so its density rises with
+population. Sizes past a few thousand measure a packed room, not just a
+bigger one.
+
+    python benchmarks/scaling.py --save results.json
+    python benchmarks/scaling.py --compare results.json   # flag regressions
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+defaultSizes = {
+    'boids': [64, 256, 1024, 4096, 16384, 65536, 100000],
+    'evacuation': [64, 256, 1024, 4096],
+}
+neighborSections = ('neighbors', 'collisions', 'getFlock')
+
+def spawn(model, populationSize, seed):
+    """Replace the model's initial flock with agents spread uniformly"""
+    import numpy as NP
+    from flock import Flock
+    rng = NP.random.default_rng(seed)
+    if model.__name__ == 'evacuation':
+        # inside the walls, clear of the avoidance radius
+        low, high = 100 + model.avoidanceRadius, 900 - model.avoidanceRadius
+    else:
+        low, high = 0, model.boardDimension
+    pos = rng.uniform(low, high, (populationSize, 2))
+    vel = rng.normal(0, model.noiseLevel, (populationSize, 2))
+    flock = Flock(pos, vel, index=model.flock.index)
+    flock.farField = model.flock.farField
+    model.flock = flock
+
+def measure(job):
+    """Run one configuration; executed in its own process"""
+    modelName, populationSize, steps, seed = job
+    import headless
+    from profiler import StepProfiler
+    model = headless.loadModel(modelName)
+    params = {'populationSize': populationSize}
+    if modelName == 'boids':
+        # keep the default density: 64 agents on a 1000 x 1000 board
+        params['boardDimension'] = 1000 * math.sqrt(populationSize / 64.0)
+    headless.configure(model, params)
+    headless.seedModel(seed)
+    model.init()
+    spawn(model, populationSize, seed)
+    model.step()
+
+    # only the totals are reported
+    profiler = StepProfiler(keepSteps=0)
+    model.profiler = profiler
+    start = time.perf_counter()
+    done = 0
+    while done < steps and not (hasattr(model, 'finished') and model.finished()):
+        model.step()
+        done += 1
+    seconds = time.perf_counter() - start
+
+    sections = profiler.seconds
+    total = profiler.stepSeconds or 1e-12
+    neighborSeconds = sum(sections.get(name, 0.0) for name in neighborSections)
+    peak = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 1024.0 if sys.platform != 'darwin' else peak / 1024.0 ** 2
+    return {
+        'model': modelName,
+        'agents': populationSize,
+        'steps': done,
+        'stepsPerSecond': done / seconds if seconds > 0 else None,
+        'peakMemoryMB': peak,
+        'neighborSeconds': neighborSeconds,
+        'integrateSeconds': sections.get('integrate', 0.0),
+        'neighborShare': neighborSeconds / total,
+        'integrateShare': sections.get('integrate', 0.0) / total,
+        'neighborCandidates': profiler.counts.get('neighborCandidates', 0) / max(done, 1),
+    }
+
+def runIsolated(job):
+    """measure(job) in a freshly spawned process, for a clean peak memory figure"""
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(1)
+    try:
+        return pool.apply(measure, (job,))
+    finally:
+        pool.close()
+        pool.join()
+
+def compare(results, baseline, tolerance):
+    """Print the change in steps per second against a saved run; returns the regressions"""
+    old = dict(((r['model'], r['agents']), r) for r in baseline['results'])
+    regressions = []
+    for r in results:
+        before = old.get((r['model'], r['agents']))
+        if not before or not before['stepsPerSecond'] or not r['stepsPerSecond']:
+            continue
+        ratio = r['stepsPerSecond'] / before['stepsPerSecond']
+        flag = ''
+        if ratio < 1 - tolerance:
+            flag = '  REGRESSION'
+            regressions.append(r)
+        print('%-10s %8d  %10.2f -> %10.2f steps/s  (%+.0f%%)%s' % (
+            r['model'], r['agents'], before['stepsPerSecond'], r['stepsPerSecond'], (ratio - 1) * 100, flag))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', nargs='+', default=['boids', 'evacuation'], choices=sorted(defaultSizes))
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help='populations to run (default: per model, up to 100k boids)')
+    parser.add_argument('--steps', type=int, default=10, help='timed steps per run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', default=None, help='write results to this JSON file')
+    parser.add_argument('--compare', default=None, help='JSON file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='slowdown counted as a regression (0.15 = 15%%)')
+    args = parser.parse_args()
+
+    results = []
+    print('%-10s %8s %12s %10s %10s %10s %12s' % ('model', 'agents', 'steps/s', 'peak MB', 'neighbor', 'integrate', 'candidates'))
+    for modelName in args.models:
+        for n in args.sizes or defaultSizes[modelName]:
+            r = runIsolated((modelName, n, args.steps, args.seed))
+            results.append(r)
+            print('%-10s %8d %12.2f %10s %9.0f%% %9.1f%% %12.0f' % (
+                r['model'], r['agents'], r['stepsPerSecond'] or 0,
+                '%.0f' % r['peakMemoryMB'] if r['peakMemoryMB'] is not None else '-',
+                r['neighborShare'] * 100, r['integrateShare'] * 100, r['neighborCandidates']))
+            sys.stdout.flush()
+
+    record = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'steps': args.steps,
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(record, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Time the double-buffered boids step against the original per-object loop.
+
+The legacy step below is the loop boids.step() used to run over Agent
+objects: every agent scans every other agent through dist.euclidean, and
+the wrap-around/velocity-swap loop over all agents sits inside the
+per-agent loop. The kernel step is boids.step() as it is now: vectorized
+rules read one snapshot, integrate() writes the back buffers and swaps.
+Results are printed and saved as JSON.
+
+    python benchmarks/stepkernel.py --sizes 32 64 128 256 --out stepkernel.json
+"""
+import argparse
+import json
+import os
+import random as RD
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from Agent import Agent
+import boids
+
+def legacyInit(populationSize):
+    agents = []
+    for i in range(populationSize):
+        row = i % 8.0
+        col = i / 8.0
+        agents.append(Agent(row*50.0+50.0, col*50.0+50.0, RD.gauss(0, boids.noiseLevel), RD.gauss(0, boids.noiseLevel), 0, 0))
+    return agents
+
+def legacyStep(agents, populationSize):
+    """boids.step() before the Flock engine, kept verbatim for comparison"""
+    for ag in agents:
+        colVect = ag.collisions(ag, boids.avoidanceRadius, agents)
+        avgLoc, avgVel = ag.getFlock(agents, boids.flockRadius)
+        alignVect = ag.align(avgVel, populationSize)
+        apprVect = ag.approach(avgLoc)
+
+        weightTot = boids.avoidanceStrength + boids.alignStrength + boids.approachStrength
+        weights = [boids.avoidanceStrength / weightTot, boids.alignStrength / weightTot, boids.approachStrength / weightTot]
+        ag.newVelX = (1 - boids.totalStrength) * ag.oldVelX + boids.totalStrength * (colVect[0] * weights[0] + alignVect[0] * weights[1] + apprVect[0] * weights[2])
+        ag.newVelY = (1 - boids.totalStrength) * ag.oldVelY + boids.totalStrength * (colVect[1] * weights[0] + alignVect[1] * weights[1] + apprVect[1] * weights[2])
+
+        ag.posX += ag.newVelX * 0.2
+        ag.posY += ag.newVelY * 0.2
+
+        for ag in agents:
+            ag.posX = ag.posX % boids.boardDimension
+            ag.posY = ag.posY % boids.boardDimension
+            ag.oldVelX = ag.newVelX
+            ag.oldVelY = ag.newVelY
+
+def timeLegacy(populationSize, steps):
+    RD.seed(0)
+    agents = legacyInit(populationSize)
+    start = time.perf_counter()
+    for s in range(steps):
+        legacyStep(agents, populationSize)
+    return (time.perf_counter() - start) / steps
+
+def timeKernel(populationSize, steps, backend):
+    RD.seed(0)
+    boids.populationSize = populationSize
+    boids.neighborBackend = backend
+    boids.init()
+    start = time.perf_counter()
+    for s in range(steps):
+        boids.step()
+    return (time.perf_counter() - start) / steps
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[32, 64, 128, 256])
+    parser.add_argument('--steps', type=int, default=5, help='steps timed per legacy run')
+    parser.add_argument('--kernel-steps', type=int, default=50, help='steps timed per kernel run')
+    parser.add_argument('--backends', nargs='+', default=['brute', 'kdtree'])
+    parser.add_argument('--out', default=None, help='JSON file for the results')
+    args = parser.parse_args()
+
+    results = []
+    print('%8s %12s ' % ('agents', 'legacy') + ' '.join('%12s %8s' % (b, 'speedup') for b in args.backends))
+    for n in args.sizes:
+        row = {'agents': n, 'legacySeconds': timeLegacy(n, args.steps)}
+        cells = []
+        for backend in args.backends:
+            seconds = timeKernel(n, args.kernel_steps, backend)
+            row[backend + 'Seconds'] = seconds
+            row[backend + 'Speedup'] = row['legacySeconds'] / seconds
+            cells.append('%10.3fms %7.0fx' % (seconds * 1000, row[backend + 'Speedup']))
+        results.append(row)
+        print('%8d %10.1fms ' % (n, row['legacySeconds'] * 1000) + ' '.join(cells))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,9 @@
-import matplotlib
-matplotlib.use("qt4agg")
-import pylab as PL
 import random as RD
 import numpy as NP
-from scipy.spatial import distance as dist
-from Agent import Agent
+from flock import Flock
+from neighbors import makeIndex
+from quadtree import QuadTree
+from profiler import NullProfiler
 
 RD.seed()
 
@@ -14,6 +13,23 @@ avoidanceRadius = 30
 flockRadius = 100
 boardDimension = 1000
 
+# neighbor search: 'kdtree', 'grid' (spatial hash) or 'brute' (reference)
+neighborBackend = 'kdtree'
+# Verlet skin beyond flockRadius: the neighbor list is reused until some
+# agent has moved skin / 2. Off by default: once flocking, agents move
+# tens of units per step, so the list would be rebuilt every step anyway
+neighborSkin = 0
+
+# Barnes-Hut quadtree for the flock sums of approach and align, for large
+# flockRadius; farFieldTheta trades accuracy for speed (0 is exact)
+farField = False
+farFieldTheta = 0.5
+
+# set to a profiler.StepProfiler to time each steering rule
+profiler = NullProfiler()
+
+renderer = None
+
 #strengths are proportion of new weight vs proportion of old weight (0-1)
 avoidanceStrength = 0.2
 approachStrength = 0.6
@@ -38,60 +54,80 @@ def noiseLevelF (val=noiseLevel):
     return val
 
 def init():
-    global time, agents
+    global time, flock
 
     time = 0
         
-    agents = []
+    pos = []
+    vel = []
     for i in range(populationSize):
         row = i % 8.0
         col = i / 8.0
-        newAgent = Agent(row*50.0+50.0, col*50.0+50.0, RD.gauss(0, noiseLevel), RD.gauss(0, noiseLevel), 0, 0)
-        agents.append(newAgent)
-
-def draw():
-    PL.cla()
-    x = [ag.posX for ag in agents]
-    y = [ag.posY for ag in agents]
-    PL.plot(x, y, 'bo')
-    PL.axis('scaled')
-    PL.axis([0, boardDimension, 0, boardDimension])
-    PL.title('t = ' + str(time))
-    PL.pause(0.03)
+        pos.append([row*50.0+50.0, col*50.0+50.0])
+        vel.append([RD.gauss(0, noiseLevel), RD.gauss(0, noiseLevel)])
+    # with the quadtree the neighbor index only serves collisions
+    radius = avoidanceRadius if farField else max(flockRadius, avoidanceRadius)
+    flock = Flock(pos, vel, index=makeIndex(neighborBackend, radius, boardDimension, periodic=True, skin=neighborSkin))
+    if farField:
+        flock.farField = QuadTree(boardDimension, farFieldTheta, periodic=True)
+
+def snapshot():
+    """Copy of what draw() needs, taken by the GUI worker thread after a step"""
+    return time, flock.pos.copy()
+
+def draw(state=None):
+    with profiler.section('draw'):
+        render(*(state or (time, flock.pos)))
 
+def render(t, pos):
+    global renderer
+    import pycxsimulator
+    if renderer is None or renderer.boardDimension != boardDimension:
+        renderer = pycxsimulator.BlitRenderer(boardDimension)
+    renderer.draw(pos[:, 0], pos[:, 1], 't = ' + str(t))
+    
 def step():
     """Update positions of each agent each time step"""
-    global time, agents
+    global time, flock
 
     time += 1
 
-#    d = dist.euclidean([agents[0].posX, agents[0].posY], [agents[1].posX, agents[1].posY])
-#    print(d)
+    # Every rule is evaluated for the whole flock at once,
+    # sharing one neighbor index built from this step's positions
+    profiler.beginStep(time)
+    with profiler.section('neighbors'):
+        flock.buildIndex()
+    if flock.index is not None:
+        profiler.count('neighborCandidates', flock.index.candidateCount)
+    with profiler.section('collisions'):
+        colVect = flock.collisions(avoidanceRadius)
+    with profiler.section('getFlock'):
+        avgLoc, avgVel = flock.getFlock(flockRadius)
+    if flock.farField is not None:
+        profiler.count('farFieldInteractions', flock.farField.interactions)
+    with profiler.section('align'):
+        alignVect = flock.align(avgVel, populationSize)
+    with profiler.section('approach'):
+        apprVect = flock.approach(avgLoc)
+    
+    weightTot = avoidanceStrength + alignStrength + approachStrength
+    # with every strength at 0 there is no steering, only the old velocity
+    weights = [s / weightTot for s in (avoidanceStrength, alignStrength, approachStrength)] if weightTot else [0.0] * 3
+    flock.newVel[:] = (1 - totalStrength) * flock.oldVel + totalStrength * (colVect * weights[0] + alignVect * weights[1] + apprVect * weights[2])
+    
+    # Update positions using new velocities, wrap agents around when they
+    # leave the screen and swap the read and write buffers
+    # Last number changes speed on screen
+    with profiler.section('integrate'):
+        flock.integrate(0.2, boardDimension)
+    profiler.endStep()
 
-    for ag in agents:
-        colVect = ag.collisions(ag, avoidanceRadius, agents)
-        avgLoc, avgVel = ag.getFlock(agents, flockRadius)
-        alignVect = ag.align(avgVel, populationSize)
-        apprVect = ag.approach(avgLoc)
-        
-        weightTot = avoidanceStrength + alignStrength + approachStrength
-        weights = [avoidanceStrength / weightTot, alignStrength / weightTot, approachStrength / weightTot]
-        ag.newVelX = (1 - totalStrength) * ag.oldVelX + totalStrength * (colVect[0] * weights[0] + alignVect[0] * weights[1] + apprVect[0] * weights[2])       
-        ag.newVelY = (1 - totalStrength) * ag.oldVelY + totalStrength * (colVect[1] * weights[0] + alignVect[1] * weights[1] + apprVect[1] * weights[2])
-        
-        # Update positions using new velocities
-        # Last number changes speed on screen
-        ag.posX += ag.newVelX * 0.2
-        ag.posY += ag.newVelY * 0.2
-        
-        # Wraps agents around when they leave the screen
-        # And shifts new weights to old weight position
-        for ag in agents:
-            ag.posX = ag.posX % boardDimension
-            ag.posY = ag.posY % boardDimension
-            ag.oldVelX = ag.newVelX
-            ag.oldVelY = ag.newVelY
-
-import pycxsimulator
-pSetters = [populationSizeF, noiseLevelF]
-pycxsimulator.GUI(parameterSetters=pSetters).start(func=[init,draw,step])
\ No newline at end of file
+if __name__ == '__main__':
+    # The GUI and its Qt backend are only needed for interactive runs;
+    # headless.py imports this module without them
+    import matplotlib
+    matplotlib.use("qt4agg")
+    import pycxsimulator
+    pSetters = [populationSizeF, noiseLevelF]
+    # the model steps in a worker thread; the window redraws the newest snapshot
+    pycxsimulator.GUI(parameterSetters=pSetters, threaded=True).start(func=[init,draw,step], snapshot=snapshot)
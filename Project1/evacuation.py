@@ -1,12 +1,11 @@
-import matplotlib
-matplotlib.use("qt4agg")
-import pylab as PL
 import random as RD
 import numpy as NP
-from numpy import linalg as LA
-from scipy.spatial import distance as dist
-from Agent import Agent
-from math import sqrt
+from flock import Flock
+from neighbors import makeIndex
+from profiler import NullProfiler
+from obstacles import DistanceField, SegmentGrid
+from navigation import NavigationField
+from floorplan import loadFloorPlan
 
 RD.seed()
 
@@ -16,6 +15,29 @@ avoidanceRadius = 50
 flockRadius = 100
 boardDimension = 1000
 
+# neighbor search: 'kdtree', 'grid' (spatial hash) or 'brute' (reference)
+neighborBackend = 'grid'
+
+# floor plan loaded by init(): 1 has one exit, 2 has exits at top and bottom
+scenario = 1
+# path of a JSON floor plan of wall segments (see floorplan.py); used instead
+# of scenario when set
+floorPlan = None
+# boardDimension a floor plan replaced, put back when init() next builds a
+# scenario
+scenarioBoardDimension = None
+# grid spacing of the precomputed wall distance field
+fieldResolution = 1
+# grid spacing of the exit navigation field
+navResolution = 5
+# cell size of the congestion heatmap
+heatmapResolution = 10
+
+# set to a profiler.StepProfiler to time each steering rule
+profiler = NullProfiler()
+
+renderer = None
+
 #strengths are proportion of new weight vs proportion of old weight (0-1)
 avoidanceStrength = 0.8
 approachStrength = 0.5
@@ -44,20 +66,40 @@ def noiseLevelF (val=noiseLevel):
     return val
 
 def init():
-    global time, agents, walls, goalPos
+    global time, flock, walls, goalPos, escaped, exitCounts, occupancy, boardDimension, scenarioBoardDimension
 
     time = 0
 
-    scenario1()
+    if floorPlan:
+        planScenario(floorPlan)
+    else:
+        if scenarioBoardDimension is not None:
+            boardDimension = scenarioBoardDimension
+            scenarioBoardDimension = None
+        if scenario == 2:
+            scenario2()
+        else:
+            scenario1()
+    escaped = NP.zeros(len(exits), dtype=int)
+    # running totals, see congestion()
+    exitCounts = NP.zeros(len(exits), dtype=int)
+    cells = int(NP.ceil(boardDimension / float(heatmapResolution)))
+    occupancy = NP.zeros((cells, cells), dtype=NP.int64)
+
+def finished():
+    """True once every agent has left the room"""
+    return len(flock) == 0
 
 def scenario1():
-    global agents, walls, goalPos, goals
-    agents = []
+    global flock, walls, wallField, goalPos, goals, exits, navField, room
+    pos = []
+    vel = []
     for i in range(populationSize):
         row = i % 8
         col = i / 8
-        newAgent = Agent(row*50+300, col*50+300, RD.gauss(0, noiseLevel), RD.gauss(0, noiseLevel), 0, 0)
-        agents.append(newAgent)
+        pos.append([row*50+300, col*50+300])
+        vel.append([RD.gauss(0, noiseLevel), RD.gauss(0, noiseLevel)])
+    flock = Flock(pos, vel, index=makeIndex(neighborBackend, max(flockRadius, avoidanceRadius), boardDimension, periodic=False))
         
     walls = []
     for i in range(60):
@@ -75,18 +117,25 @@ def scenario1():
     for i in range(160):
         newWall = [900, i*5+100]
         walls.append(newWall)
+    walls = NP.array(walls, dtype=float)
+    wallField = DistanceField(walls, boardDimension, fieldResolution)
         
-    goals = 1
     goalPos = [500,100]
+    exits = [goalPos]
+    goals = len(exits)
+    navField = NavigationField(walls, exits, boardDimension, navResolution)
+    room = (100, 100, 900, 900)
     
 def scenario2():
-    global agents, walls, goalPos, goalPos2, goals
-    agents = []
+    global flock, walls, wallField, goalPos, goalPos2, goals, exits, navField, room
+    pos = []
+    vel = []
     for i in range(populationSize):
         row = i % 8.0
         col = i / 8.0
-        newAgent = Agent(row*50+300, col*50+300, RD.gauss(0, noiseLevel), RD.gauss(0, noiseLevel), 0, 0)
-        agents.append(newAgent)
+        pos.append([row*50+300, col*50+300])
+        vel.append([RD.gauss(0, noiseLevel), RD.gauss(0, noiseLevel)])
+    flock = Flock(pos, vel, index=makeIndex(neighborBackend, max(flockRadius, avoidanceRadius), boardDimension, periodic=False))
         
     walls = []
     for i in range(60):
@@ -107,89 +156,104 @@ def scenario2():
     for i in range(160):
         newWall = [900, i*5+100]
         walls.append(newWall)
+    walls = NP.array(walls, dtype=float)
+    wallField = DistanceField(walls, boardDimension, fieldResolution)
         
-    goals = 2
     goalPos = [500, 100]
     goalPos2 = [500, 900]
+    exits = [goalPos, goalPos2]
+    goals = len(exits)
+    navField = NavigationField(walls, exits, boardDimension, navResolution)
+    room = (100, 100, 900, 900)
 
-def draw():
-    PL.cla()
-    PL.plot([wall[0] for wall in walls], [wall[1] for wall in walls], 'ro')
-    x = [ag.posX for ag in agents]
-    y = [ag.posY for ag in agents]
-    PL.plot(x, y, 'bo')
-    
-    PL.axis('scaled')
-    PL.axis([0, boardDimension, 0, boardDimension])
-    PL.title('t = ' + str(time))
-    PL.pause(0.01)
+def planScenario(path):
+    """Load walls, exits and room from a floor plan file"""
+    global flock, walls, wallField, goalPos, goalPos2, goals, exits, navField, room, boardDimension, scenarioBoardDimension
+    plan = loadFloorPlan(path)
+    if scenarioBoardDimension is None:
+        scenarioBoardDimension = boardDimension
+    boardDimension = plan.boardDimension
+    pos = plan.spawn(populationSize)
+    vel = [[RD.gauss(0, noiseLevel), RD.gauss(0, noiseLevel)] for i in range(populationSize)]
+    flock = Flock(pos, vel, index=makeIndex(neighborBackend, max(flockRadius, avoidanceRadius), boardDimension, periodic=False))
+
+    # exact distances to the segments; the sampled points are only for
+    # rasterizing the navigation grid and drawing
+    wallField = SegmentGrid(plan.segments, avoidanceRadius)
+    walls = plan.points(navResolution / 2.0)
+
+    exits = plan.exits
+    goalPos = exits[0]
+    goalPos2 = exits[1] if len(exits) > 1 else None
+    goals = len(exits)
+    navField = NavigationField(walls, exits, boardDimension, navResolution)
+    room = plan.room
+
+def snapshot():
+    """Copy of what draw() needs, taken by the GUI worker thread after a step"""
+    return time, flock.pos.copy(), walls
+
+def draw(state=None):
+    with profiler.section('draw'):
+        render(*(state or (time, flock.pos, walls)))
+
+def render(t, pos, walls):
+    global renderer
+    import pycxsimulator
+    if renderer is None or renderer.boardDimension != boardDimension:
+        renderer = pycxsimulator.BlitRenderer(boardDimension)
+    renderer.draw(pos[:, 0], pos[:, 1], 't = ' + str(t), static=[(walls, 'ro')])
     
 def step():
     """Update positions of each agent each time step"""
-    global time, agents, walls, goalPos, flag
+    global time, flock, walls, navField, flag
 
     time += 1
     
-    for ag in agents:
-#        print(ag.oldVelX, ag.oldVelY)
-        colVect = ag.collisions(ag, avoidanceRadius, agents)
-        avgLoc, avgVel = ag.getFlock(agents, flockRadius)
-        alignVect = ag.align(avgVel, populationSize)
-        apprVect = ag.approach(avgLoc)
-        avoidVect = ag.avoidObstacles(walls, avoidanceRadius, flag)
-        goalVect = ag.goal(goalPos)
-#        avoidVect = ag.collisions(ag, avoidanceRadius, walls)
-        
-        # Works perfectly without these two vectors...but wouldn't that practically eliminate the boids incorporation?
-        #apprVect = [0,0]
-        #alignVect = [0,0]
-        
-        # Put a max limit on the velocity?
-        limit = 50
-        if ag.oldVelX > limit:
-            ag.oldVelX = sqrt(ag.oldVelX - limit) + 0.8 * limit
-        if ag.oldVelY > limit:
-            ag.oldVelY = sqrt(ag.oldVelY - limit) + 0.8 * limit
-        
-        # If there are multiple exits, agents should move to the closest one
-        if goals == 2:
-            d1 = dist.euclidean([ag.posX, ag.posY], goalPos)
-            d2 = dist.euclidean([ag.posX, ag.posY], goalPos2)
-            if d1 < d2:
-                goalVect = ag.goal(goalPos)
-            else:
-                goalVect = ag.goal(goalPos2)
-            
-            escape(goalPos2)
-        escape(goalPos)
-        
-        # If there is a collision, completely ignore other vectors? Only focus on collision? (don't think this is necessary)
-        if False:
-#        if flag[0] == True:
-            print(flag[0])
-            weightTot = obstacleStrength
-            weights = [1]
-            ag.newVelX = (1 - totalStrength) * ag.oldVelX + totalStrength * (avoidVect[0])
-            ag.newVelY = (1 - totalStrength) * ag.oldVelY + totalStrength * (avoidVect[1])
-        else:
-            weightTot = avoidanceStrength + alignStrength + approachStrength + obstacleStrength + goalStrength
-            weights = [avoidanceStrength / weightTot, alignStrength / weightTot, approachStrength / weightTot, obstacleStrength / weightTot, goalStrength / weightTot]
-            
-            ag.newVelX = (1 - totalStrength) * ag.oldVelX + totalStrength * (colVect[0] * weights[0] + alignVect[0] * weights[1] + apprVect[0] * weights[2] + avoidVect[0] * weights[3] + goalVect[0] * weights[4])       
-            ag.newVelY = (1 - totalStrength) * ag.oldVelY + totalStrength * (colVect[1] * weights[0] + alignVect[1] * weights[1] + apprVect[1] * weights[2] + avoidVect[1] * weights[3] + goalVect[1] * weights[4])
-        
-        # Update positions using new velocities
-        # Last number changes speed on screen
-        ag.posX += ag.newVelX * 0.1
-        ag.posY += ag.newVelY * 0.1
-        
-        # Wraps agents around when they leave the screen
-        # And shifts new weights to old weight position
-        for ag in agents:
-            ag.posX = ag.posX % boardDimension
-            ag.posY = ag.posY % boardDimension
-            ag.oldVelX = ag.newVelX
-            ag.oldVelY = ag.newVelY
+    # Every rule is evaluated for the whole flock at once,
+    # sharing one neighbor index built from this step's positions
+    profiler.beginStep(time)
+    with profiler.section('neighbors'):
+        flock.buildIndex()
+    if flock.index is not None:
+        profiler.count('neighborCandidates', flock.index.candidateCount)
+    with profiler.section('collisions'):
+        colVect = flock.collisions(avoidanceRadius)
+    with profiler.section('getFlock'):
+        avgLoc, avgVel = flock.getFlock(flockRadius)
+    with profiler.section('align'):
+        alignVect = flock.align(avgVel, populationSize)
+    with profiler.section('approach'):
+        apprVect = flock.approach(avgLoc)
+    with profiler.section('avoidObstacles'):
+        avoidVect = flock.avoidObstacles(wallField, avoidanceRadius, flag)
+    
+    # Agents walk to the closest exit, around the walls, along the navigation field
+    with profiler.section('goal'):
+        goalVect = flock.goal(navField)
+    
+    # Put a max limit on the velocity?
+    # (computed into a copy so the read buffer stays untouched)
+    limit = 50
+    oldVel = NP.where(flock.oldVel > limit, NP.sqrt(NP.maximum(flock.oldVel - limit, 0)) + 0.8 * limit, flock.oldVel)
+    
+    weightTot = avoidanceStrength + alignStrength + approachStrength + obstacleStrength + goalStrength
+    # with every strength at 0 there is no steering, only the old velocity
+    weights = [s / weightTot for s in (avoidanceStrength, alignStrength, approachStrength, obstacleStrength, goalStrength)] if weightTot else [0.0] * 5
+    
+    flock.newVel[:] = (1 - totalStrength) * oldVel + totalStrength * (colVect * weights[0] + alignVect * weights[1] + apprVect * weights[2] + avoidVect * weights[3] + goalVect * weights[4])
+    
+    # Update positions using new velocities, wrap agents around when they
+    # leave the screen and swap the read and write buffers
+    # Last number changes speed on screen
+    with profiler.section('integrate'):
+        flock.integrate(0.1, boardDimension)
+    
+    with profiler.section('escape'):
+        escape()
+    with profiler.section('congestion'):
+        accumulate()
+    profiler.endStep()
 
 #    for ag in agents:
 #        colVect = ag.collisions(ag, avoidanceRadius, agents)
@@ -206,16 +270,46 @@ def step():
 #        ag.newVelY = ag.oldVelY + colVect[1] + alignVect[1] + apprVect[1] + avoidVect[1]
 
 # Agents should disappear after reaching target position
-def escape(goalPos):
-    global agents
-    for ag in agents:
-        #if dist.euclidean([ag.posX, ag.posY], goalPos) < 10:
-        #    agents.remove(ag)
-        
-        #Removes agents when they leave
-        if ag.posX < 100 or ag.posX > 900 or ag.posY < 100 or ag.posY > 900:
-            agents.remove(ag)
-    
+def escape():
+    global flock, escaped, exitCounts
+    #Removes agents when they leave
+    x = flock.pos[:, 0]
+    y = flock.pos[:, 1]
+    # one vectorized pass finds everyone outside the room
+    left, bottom, right, top = room
+    leaving = NP.nonzero((x < left) | (x > right) | (y < bottom) | (y > top))[0]
+    # Count who left through which exit (the closest one) this step
+    toExit = ((flock.pos[leaving, None, :] - NP.asarray(exits, dtype=float)[None, :, :]) ** 2).sum(axis=2)
+    escaped = NP.bincount(toExit.argmin(axis=1), minlength=len(exits))
+    exitCounts += escaped
+    # swap-remove: cost grows with the number leaving, not the crowd size
+    flock.remove(leaving)
+
+def accumulate():
+    """Add every agent still in the room to its heatmap cell, one pass over the flock"""
+    global occupancy
+    cells = len(occupancy)
+    cell = NP.clip((flock.pos // heatmapResolution).astype(int), 0, cells - 1)
+    occupancy += NP.bincount(cell[:, 0] * cells + cell[:, 1], minlength=cells * cells).reshape(cells, cells)
+
+def congestion():
+    """Heatmap and exit counters accumulated so far; safe to call mid-run.
+
+    occupancy[i, j] counts agent-steps spent in the cell at x in
+    [i, i+1) * heatmapResolution and y in [j, j+1) * heatmapResolution;
+    meanOccupancy divides it by the steps taken. exitCounts[k] is the
+    number of agents that have left through exits[k], exitRate the same
+    per step.
+    """
+    steps = max(time, 1)
+    return {
+        'step': time,
+        'resolution': heatmapResolution,
+        'occupancy': occupancy.copy(),
+        'meanOccupancy': occupancy / float(steps),
+        'exitCounts': exitCounts.copy(),
+        'exitRate': exitCounts / float(steps),
+    }
 
 def normalize(x, y):
     mag = float(NP.sqrt(x*x + y*y))
@@ -223,6 +317,12 @@ def normalize(x, y):
     newY = y/mag
     return [newX, newY]
 
-import pycxsimulator
-pSetters = [populationSizeF, noiseLevelF]
-pycxsimulator.GUI(parameterSetters=pSetters).start(func=[init,draw,step])
\ No newline at end of file
+if __name__ == '__main__':
+    # The GUI and its Qt backend are only needed for interactive runs;
+    # headless.py imports this module without them
+    import matplotlib
+    matplotlib.use("qt4agg")
+    import pycxsimulator
+    pSetters = [populationSizeF, noiseLevelF]
+    # the model steps in a worker thread; the window redraws the newest snapshot
+    pycxsimulator.GUI(parameterSetters=pSetters, threaded=True).start(func=[init,draw,step], snapshot=snapshot)
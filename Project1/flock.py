@@ -0,0 +1,223 @@
+import numpy as NP
+from Agent import AgentView
+from neighbors import closestPerRow
+
+class Flock:
+    """Struct-of-arrays state for a whole population of agents.
+
+    Positions and velocities live in (N, 2) float arrays so that the steering
+    rules of Agent can be evaluated for every agent in one vectorized call.
+    Row k of each array is agent k; AgentView gives the old per-object API.
+
+    If `index` is set (e.g. a neighbors.SpatialHash) neighbor queries go
+    through it instead of comparing every pair of agents. If `farField` is
+    set (a quadtree.QuadTree), getFlock() takes its sums from the tree
+    instead, and the index only has to serve the avoidance radius.
+
+    A step is double-buffered: the rules only read pos and oldVel, the model
+    writes the new velocities into newVel, and integrate() moves everyone
+    into the back buffer nextPos before swapping both pairs. Every agent is
+    therefore updated from the same snapshot of the previous step.
+    """
+
+    # upper bound on the number of pair distances held in memory at once
+    chunkSize = 2**22
+
+    def __init__(self, pos, oldVel, newVel=None, index=None):
+        self.pos = NP.array(pos, dtype=float).reshape(-1, 2)
+        self.oldVel = NP.array(oldVel, dtype=float).reshape(-1, 2)
+        if newVel is None:
+            self.newVel = NP.zeros_like(self.oldVel)
+        else:
+            self.newVel = NP.array(newVel, dtype=float).reshape(-1, 2)
+        self.nextPos = NP.empty_like(self.pos)
+        # row each agent started in; survives keep(), so agents can be traced
+        self.ids = NP.arange(len(self.pos))
+        self.index = index
+        self.farField = None
+
+    @classmethod
+    def fromAgents(cls, agents):
+        """Copy a list of Agent objects into a new Flock"""
+        return cls([[ag.posX, ag.posY] for ag in agents],
+                   [[ag.oldVelX, ag.oldVelY] for ag in agents],
+                   [[ag.newVelX, ag.newVelY] for ag in agents])
+
+    def __len__(self):
+        return len(self.pos)
+
+    def __getitem__(self, index):
+        return AgentView(self, index)
+
+    def views(self):
+        """Agent-like views onto every row, for small scenarios and debugging"""
+        return [AgentView(self, i) for i in range(len(self))]
+
+    def keep(self, mask):
+        """Drop every agent whose entry in mask is False"""
+        self.remove(NP.nonzero(~NP.asarray(mask, dtype=bool))[0])
+
+    def remove(self, rows):
+        """Drop the agents in the given rows by swap-remove.
+
+        Survivors from the end of the arrays move into the freed rows and
+        every array is cut to the new length as a view of its buffer, so the
+        cost is proportional to the number of agents removed, not to the
+        population. Row order is not preserved; ids keeps track of agents.
+        """
+        rows = NP.unique(rows)
+        if not len(rows):
+            return
+        n = len(self) - len(rows)
+        holes = rows[rows < n]
+        tail = NP.ones(len(self) - n, dtype=bool)
+        tail[rows[rows >= n] - n] = False
+        moved = NP.nonzero(tail)[0] + n
+        for name in ('pos', 'oldVel', 'newVel', 'ids'):
+            array = getattr(self, name)
+            array[holes] = array[moved]
+            setattr(self, name, array[:n])
+        self.nextPos = self.nextPos[:n]
+        if self.index is not None:
+            self.index.clear()
+
+    def integrate(self, speed, boardDimension):
+        """Move every agent by newVel * speed, wrap around the board, then swap buffers.
+
+        Afterwards pos and oldVel hold the new state; nextPos and newVel are
+        free to be overwritten by the next step.
+        """
+        NP.multiply(self.newVel, speed, out=self.nextPos)
+        self.nextPos += self.pos
+        NP.mod(self.nextPos, boardDimension, out=self.nextPos)
+        self.pos, self.nextPos = self.nextPos, self.pos
+        self.oldVel, self.newVel = self.newVel, self.oldVel
+
+    def buildIndex(self):
+        """Rebuild the neighbor index from current positions, once per step.
+
+        The pair search for the largest radius runs here as well, so the
+        rules that follow only filter its result.
+        """
+        if self.index is not None:
+            self.index.build(self.pos)
+            self.index.query(self.index.cellSize)
+
+    def pairsWithin(self, points, radius):
+        """Find every (agent, point) pair closer than radius.
+
+        Returns agent indices, point indices, displacement agent - point and
+        distance, one entry per pair. Distances are computed in blocks of
+        agents so memory stays bounded by chunkSize.
+        """
+        points = NP.asarray(points, dtype=float).reshape(-1, 2)
+        rows, cols, deltas, dists = [], [], [], []
+        if len(self) and len(points):
+            block = max(1, self.chunkSize // len(points))
+            for start in range(0, len(self), block):
+                delta = self.pos[start:start + block, None, :] - points[None, :, :]
+                d = NP.sqrt((delta ** 2).sum(axis=2))
+                r, c = NP.nonzero(d < radius)
+                rows.append(r + start)
+                cols.append(c)
+                deltas.append(delta[r, c])
+                dists.append(d[r, c])
+        if not rows:
+            return (NP.zeros(0, dtype=int), NP.zeros(0, dtype=int),
+                    NP.zeros((0, 2)), NP.zeros(0))
+        return (NP.concatenate(rows), NP.concatenate(cols),
+                NP.concatenate(deltas), NP.concatenate(dists))
+
+    def neighbors(self, radius):
+        """All ordered pairs (i, j), i != j, of agents closer than radius"""
+        if self.index is not None:
+            if not self.index.built:
+                self.index.build(self.pos)
+            return self.index.query(radius)
+        i, j, delta, d = self.pairsWithin(self.pos, radius)
+        notSelf = i != j
+        return i[notSelf], j[notSelf], delta[notSelf], d[notSelf]
+
+    def _repel(self, i, delta, d, radius):
+        """Push each agent away from its closest pair partner.
+
+        Same rule as Agent.collisions: partners sharing an x or y coordinate
+        are ignored, agents with no partner keep their old velocity.
+        """
+        proxVect = self.oldVel.copy()
+        valid = (delta[:, 0] != 0) & (delta[:, 1] != 0)
+        i, delta, d = i[valid], delta[valid], d[valid]
+        if len(i):
+            closest = closestPerRow(i, d)
+            proxVect[i[closest]] = delta[closest] * (radius - d[closest])[:, None]
+        return proxVect, i
+
+    def collisions(self, avoidanceRadius):
+        """Vectorized Agent.collisions for every agent"""
+        i, j, delta, d = self.neighbors(avoidanceRadius)
+        return self._repel(i, delta, d, avoidanceRadius)[0]
+
+    def getFlock(self, flockRadius):
+        """Vectorized Agent.getFlock: summed location and velocity within flockRadius"""
+        if self.farField is not None:
+            self.farField.build(self.pos, self.oldVel)
+            return self.farField.flockSums(flockRadius)
+        i, j, delta, d = self.neighbors(flockRadius)
+        n = len(self)
+        # every agent is inside its own flock radius
+        avgLoc = self.pos.copy()
+        avgVel = self.oldVel.copy()
+        # neighbor location as seen from agent i, which is its nearest
+        # periodic image when the index wraps around the board
+        other = self.pos[i] - delta
+        for axis in range(2):
+            avgLoc[:, axis] += NP.bincount(i, weights=other[:, axis], minlength=n)
+            avgVel[:, axis] += NP.bincount(i, weights=self.oldVel[j, axis], minlength=n)
+        return avgLoc, avgVel
+
+    def align(self, avgVel, populationSize):
+        """Vectorized Agent.align"""
+        return avgVel / populationSize
+
+    def approach(self, avgLoc):
+        """Vectorized Agent.approach"""
+        # Agent.approach divides by len(flock), which is always the 2 entries of [x, y]
+        return (avgLoc / 2.0 - self.pos) * 0.1
+
+    def avoidObstacles(self, obstacles, avoidanceRadius, flag):
+        """Vectorized Agent.avoidObstacles; sets flag[0] if any agent is near a wall
+
+        obstacles is either an array of wall points or an object with a
+        nearest(pos) method (e.g. obstacles.DistanceField) returning the
+        displacement from, and distance to, the closest wall of each agent.
+        """
+        if hasattr(obstacles, 'nearest'):
+            delta, d = obstacles.nearest(self.pos)
+            hit = NP.nonzero((d < avoidanceRadius) & (d > 0))[0]
+            proxVect = self.oldVel.copy()
+            proxVect[hit] = delta[hit] * (avoidanceRadius - d[hit])[:, None]
+        else:
+            i, j, delta, d = self.pairsWithin(obstacles, avoidanceRadius)
+            proxVect, hit = self._repel(i, delta, d, avoidanceRadius)
+        if len(hit):
+            flag[0] = True
+        return proxVect
+
+    def goal(self, goalPos):
+        """Vectorized Agent.goal
+
+        goalPos is either a single [x, y] target, approached in a straight
+        line, or an object with lookup(pos) (e.g. navigation.NavigationField)
+        returning the direction and walking distance to the nearest exit.
+        Either way the pull is 50000 / distance, as in Agent.goal.
+        """
+        if hasattr(goalPos, 'lookup'):
+            direction, d = goalPos.lookup(self.pos)
+            # agents standing on an exit node still get a finite pull
+            d = NP.maximum(d, goalPos.resolution)[:, None]
+            with NP.errstate(invalid='ignore'):
+                return NP.where(NP.isfinite(d), direction * (50000 / d), 0.0)
+        goalVect = NP.asarray(goalPos, dtype=float) - self.pos
+        d = NP.sqrt((goalVect ** 2).sum(axis=1))[:, None]
+        strength = 50000 / d
+        return goalVect / d * strength
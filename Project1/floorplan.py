@@ -0,0 +1,74 @@
+"""Evacuation floor plans described by wall segments instead of sampled points.
+
+A floor plan is a JSON file:
+
+    {
+      "boardDimension": 1000,
+      "room": [100, 100, 900, 900],
+      "walls": [[100, 900, 900, 900], ...],
+      "polygons": [[[400, 400], [500, 400], [450, 480]]],
+      "exits": [[500, 100]],
+      "spawn": {"origin": [300, 300], "spacing": 50, "columns": 8}
+    }
+
+walls are segments [x1, y1, x2, y2]; every polygon adds the segments of
+its closed outline. Agents leave the model once outside room
+[xmin, ymin, xmax, ymax] and start on a grid of `columns` columns from
+`origin`, as in scenario1/2. Only walls and exits are required.
+
+    python headless.py evacuation --set floorPlan=floorplans/scenario2.json
+"""
+import json
+
+import numpy as NP
+
+from neighbors import runOffsets
+
+class FloorPlan:
+    """Walls, exits, room bounds and spawn grid of an evacuation scenario"""
+
+    def __init__(self, segments, exits, boardDimension=1000, room=(100, 100, 900, 900),
+                 spawnOrigin=(300, 300), spawnSpacing=50, spawnColumns=8):
+        self.segments = NP.asarray(segments, dtype=float).reshape(-1, 4)
+        self.exits = [list(map(float, e)) for e in exits]
+        self.boardDimension = boardDimension
+        self.room = tuple(room)
+        self.spawnOrigin = spawnOrigin
+        self.spawnSpacing = spawnSpacing
+        self.spawnColumns = spawnColumns
+
+    def spawn(self, populationSize):
+        """Starting positions, row by row on the spawn grid"""
+        i = NP.arange(populationSize)
+        grid = NP.stack([i % self.spawnColumns, i // self.spawnColumns], axis=1)
+        return grid * float(self.spawnSpacing) + self.spawnOrigin
+
+    def points(self, spacing):
+        """Points along every wall no more than spacing apart, for rasterizing and drawing"""
+        start, end = self.segments[:, :2], self.segments[:, 2:]
+        length = NP.sqrt(((end - start) ** 2).sum(axis=1))
+        steps = NP.maximum(1, NP.ceil(length / spacing)).astype(int) + 1
+        owner = NP.repeat(NP.arange(len(self.segments)), steps)
+        t = runOffsets(steps) / (steps[owner] - 1.0)
+        return start[owner] + t[:, None] * (end - start)[owner]
+
+def polygonSegments(polygon):
+    """Segments of the closed outline through the given vertices"""
+    vertices = NP.asarray(polygon, dtype=float).reshape(-1, 2)
+    return NP.hstack([vertices, NP.roll(vertices, -1, axis=0)])
+
+def loadFloorPlan(path):
+    """Read a FloorPlan from a JSON file"""
+    with open(path) as f:
+        spec = json.load(f)
+    segments = [NP.asarray(spec.get('walls', []), dtype=float).reshape(-1, 4)]
+    segments += [polygonSegments(p) for p in spec.get('polygons', [])]
+    if not spec.get('exits'):
+        raise ValueError("floor plan %s has no exits" % path)
+    spawn = spec.get('spawn', {})
+    return FloorPlan(NP.vstack(segments), spec['exits'],
+                     spec.get('boardDimension', 1000),
+                     spec.get('room', (100, 100, 900, 900)),
+                     spawn.get('origin', (300, 300)),
+                     spawn.get('spacing', 50),
+                     spawn.get('columns', 8))
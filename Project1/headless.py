@@ -0,0 +1,172 @@
+"""Run the Project1 crowd models without a GUI.
+
+The models (boids, evacuation) are imported as plain modules; their
+pycxsimulator GUI only starts when a model file is run directly, and
+matplotlib is only imported when draw() is called. This runner calls
+init() and then step() for a fixed number of steps, or until the model's
+finished() reports that evacuation is complete, and writes metrics as JSON
+lines.
+
+    python headless.py evacuation --steps 5000 --set populationSize=1000 scenario=2
+    python headless.py boids --steps 200 --metrics boids.jsonl --every 10
+    python headless.py evacuation --profile evacuation_profile.csv
+    python headless.py evacuation --trajectory run.trj --trajectory-every 2
+"""
+import argparse
+import ast
+import importlib
+import json
+import random as RD
+import sys
+import time as clock
+
+import numpy as NP
+
+from profiler import StepProfiler
+from trajectory import TrajectoryWriter
+
+models = ['boids', 'evacuation']
+
+def loadModel(name):
+    """Import a model module by name, e.g. 'evacuation'"""
+    return importlib.import_module(name)
+
+def parseValue(text):
+    """Turn a --set value into an int, float or literal such as False or None, or leave it as a string"""
+    for convert in (int, float, ast.literal_eval):
+        try:
+            return convert(text)
+        except (ValueError, TypeError, SyntaxError):
+            pass
+    return text
+
+def parseSetting(text):
+    """argparse type of --set items: NAME=VALUE as a (name, parsed value) pair"""
+    name, sep, val = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError("expected NAME=VALUE, got %r" % text)
+    return name, parseValue(val)
+
+def configure(model, params):
+    """Set module-level parameters such as populationSize or goalStrength"""
+    for name, val in params.items():
+        if not hasattr(model, name):
+            raise AttributeError("%s has no parameter %r" % (model.__name__, name))
+        setattr(model, name, val)
+
+def seedModel(seed):
+    """Seed both random generators the models may draw from"""
+    RD.seed(seed)
+    NP.random.seed(seed)
+
+def snapshot(model, stepSeconds):
+    """Metrics describing the current model state"""
+    flock = model.flock
+    speed = NP.sqrt((flock.oldVel ** 2).sum(axis=1))
+    record = {
+        'step': model.time,
+        'agents': len(flock),
+        'meanSpeed': float(speed.mean()) if len(flock) else 0.0,
+        'stepSeconds': stepSeconds,
+    }
+    if hasattr(model, 'exitCounts'):
+        record['exitCounts'] = model.exitCounts.tolist()
+    return record
+
+def run(model, steps, params=None, seed=None, every=0, emit=None, profiler=None, trajectory=None):
+    """Run `model` for `steps` steps or until model.finished() is True.
+
+    model is a module (or name) exposing init() and step(). Every `every`
+    steps a metrics dict is passed to emit; the summary of the whole run is
+    returned (and emitted too). A profiler.StepProfiler passed as profiler
+    is installed in the model and its summary added to the run summary.
+    If trajectory is a path, positions and velocities are saved there as a
+    trajectory.TrajectoryWriter file every trajectoryEvery steps; pass
+    (path, trajectoryEvery) to record less often than every step.
+    """
+    if isinstance(model, str):
+        model = loadModel(model)
+    configure(model, params or {})
+    if profiler is not None:
+        model.profiler = profiler
+    if seed is not None:
+        seedModel(seed)
+    finished = getattr(model, 'finished', None)
+
+    started = clock.perf_counter()
+    model.init()
+    initSeconds = clock.perf_counter() - started
+    writer = None
+    if trajectory is not None:
+        path, trajectoryEvery = trajectory if isinstance(trajectory, tuple) else (trajectory, 1)
+        writer = TrajectoryWriter.forModel(path, model, trajectoryEvery)
+        writer.capture(model)
+    done = 0
+    try:
+        while done < steps and not (finished and finished()):
+            before = clock.perf_counter()
+            model.step()
+            stepSeconds = clock.perf_counter() - before
+            done += 1
+            if writer is not None:
+                writer.capture(model)
+            if emit and every and done % every == 0:
+                emit(snapshot(model, stepSeconds))
+    finally:
+        if writer is not None:
+            writer.close()
+    wallSeconds = clock.perf_counter() - started
+
+    summary = {
+        'model': model.__name__,
+        'seed': seed,
+        'params': params or {},
+        'steps': done,
+        'agents': len(model.flock),
+        'finished': bool(finished and finished()),
+        'initSeconds': initSeconds,
+        'wallSeconds': wallSeconds,
+        'stepsPerSecond': done / max(wallSeconds - initSeconds, 1e-12),
+    }
+    if profiler is not None:
+        summary['profile'] = profiler.summary()
+    if emit:
+        emit(summary)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Project1 crowd model without a GUI")
+    parser.add_argument('model', choices=models)
+    parser.add_argument('--steps', type=int, default=1000, help='maximum number of steps')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--set', nargs='*', default=[], type=parseSetting, metavar='NAME=VALUE',
+                        help='module-level parameters, e.g. populationSize=500')
+    parser.add_argument('--every', type=int, default=0, help='emit metrics every N steps (0: summary only)')
+    parser.add_argument('--metrics', default='-', help='JSON lines output file, - for stdout')
+    parser.add_argument('--profile', default=None, metavar='PATH',
+                        help='time each steering rule and save per-step timings (.csv or .json)')
+    parser.add_argument('--profile-steps', type=int, default=None, metavar='N',
+                        help='keep the per-step timings of only the last N steps (default: all)')
+    parser.add_argument('--trajectory', default=None, metavar='PATH',
+                        help='record positions and velocities for replay.py')
+    parser.add_argument('--trajectory-every', type=int, default=1, metavar='K',
+                        help='record every K-th step into the trajectory')
+    args = parser.parse_args(argv)
+
+    params = dict(args.set)
+
+    out = sys.stdout if args.metrics == '-' else open(args.metrics, 'w')
+    try:
+        def emit(record):
+            out.write(json.dumps(record) + '\n')
+        profiler = StepProfiler(args.profile_steps) if args.profile else None
+        trajectory = (args.trajectory, args.trajectory_every) if args.trajectory else None
+        run(args.model, args.steps, params, args.seed, args.every, emit, profiler, trajectory)
+        if profiler is not None:
+            profiler.save(args.profile)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == '__main__':
+    main()
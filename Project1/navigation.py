@@ -0,0 +1,95 @@
+import numpy as NP
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# the eight grid moves; diagonals may not cut between two blocked nodes
+moves = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+class NavigationField:
+    """Walking distance to the nearest exit and the direction to take, for the whole board.
+
+    Wall points are rasterized onto a grid of nodes spaced `resolution`
+    apart. A multi-source Dijkstra search from every exit over the
+    8-connected grid gives each node its distance to the closest exit,
+    routed around the walls. The direction field points down that distance;
+    where a neighbor is unreachable it falls back to the steepest step, so
+    agents are led around wall ends and through doors. Built once per
+    scenario, any number of exits, one array lookup per agent per step.
+    """
+
+    def __init__(self, walls, exits, boardDimension, resolution=5.0):
+        self.boardDimension = boardDimension
+        self.resolution = float(resolution)
+        self.nodes = int(NP.ceil(boardDimension / self.resolution)) + 1
+        n = self.nodes
+        blocked = NP.zeros((n, n), dtype=bool)
+        walls = NP.asarray(walls, dtype=float).reshape(-1, 2)
+        cell = NP.rint(walls / self.resolution).astype(int)
+        onBoard = ((cell >= 0) & (cell < n)).all(axis=1)
+        blocked[cell[onBoard, 0], cell[onBoard, 1]] = True
+        exitCells = NP.clip(NP.rint(NP.asarray(exits, dtype=float).reshape(-1, 2) / self.resolution).astype(int), 0, n - 1)
+        # an exit drawn on top of a wall point is still a way out
+        blocked[exitCells[:, 0], exitCells[:, 1]] = False
+        self.blocked = blocked
+
+        free = NP.pad(~blocked, 1, constant_values=False)
+        node = NP.arange(n * n).reshape(n, n)
+        rows, cols, weights = [], [], []
+        for dx, dy in moves:
+            allowed = free[1:-1, 1:-1] & free[1 + dx:n + 1 + dx, 1 + dy:n + 1 + dy]
+            if dx and dy:
+                allowed &= free[1 + dx:n + 1 + dx, 1:-1] & free[1:-1, 1 + dy:n + 1 + dy]
+            src = node[allowed]
+            rows.append(src)
+            cols.append(src + dx * n + dy)
+            weights.append(NP.full(len(src), self.resolution * NP.hypot(dx, dy)))
+        graph = coo_matrix((NP.concatenate(weights), (NP.concatenate(rows), NP.concatenate(cols))),
+                           shape=(n * n, n * n)).tocsr()
+        sources = exitCells[:, 0] * n + exitCells[:, 1]
+        self.distance = dijkstra(graph, directed=True, indices=sources, min_only=True).reshape(n, n)
+        self.direction = self._descent(self.distance)
+
+    def _descent(self, distance):
+        """Unit vectors pointing down the distance field at every node"""
+        n = self.nodes
+        padded = NP.pad(distance, 1, constant_values=NP.inf)
+        centre = padded[1:-1, 1:-1]
+        grad = NP.zeros((n, n, 2))
+        for axis in range(2):
+            ahead = padded[2:, 1:-1] if axis == 0 else padded[1:-1, 2:]
+            behind = padded[:-2, 1:-1] if axis == 0 else padded[1:-1, :-2]
+            with NP.errstate(invalid='ignore'):
+                forward = ahead - centre
+                backward = centre - behind
+                okF = NP.isfinite(forward)
+                okB = NP.isfinite(backward)
+                # central difference where both sides are reachable, one-sided otherwise
+                grad[:, :, axis] = NP.where(okF & okB, (forward + backward) / 2,
+                                            NP.where(okF, forward, NP.where(okB, backward, 0.0)))
+        direction = -grad
+        norm = NP.sqrt((direction ** 2).sum(axis=2))
+        with NP.errstate(invalid='ignore', divide='ignore'):
+            direction /= norm[:, :, None]
+        direction[norm == 0] = 0.0
+
+        # next to walls the difference can point into a blocked node; step to the
+        # lowest reachable neighbor instead
+        best = centre.copy()
+        step = NP.zeros((n, n, 2))
+        for dx, dy in moves:
+            other = padded[1 + dx:n + 1 + dx, 1 + dy:n + 1 + dy]
+            lower = other < best
+            best = NP.where(lower, other, best)
+            step[lower] = NP.array([dx, dy]) / NP.hypot(dx, dy)
+        ahead = NP.rint(direction).astype(int)
+        target = padded[1 + NP.clip(NP.arange(n)[:, None] + ahead[:, :, 0], -1, n),
+                        1 + NP.clip(NP.arange(n)[None, :] + ahead[:, :, 1], -1, n)]
+        stuck = ~NP.isfinite(target) | (norm == 0)
+        direction[stuck] = step[stuck]
+        direction[~NP.isfinite(centre)] = 0.0
+        return direction
+
+    def lookup(self, pos):
+        """Direction toward the nearest exit and the walking distance left, per agent"""
+        cell = NP.clip(NP.rint(NP.asarray(pos, dtype=float) / self.resolution).astype(int), 0, self.nodes - 1)
+        return self.direction[cell[:, 0], cell[:, 1]], self.distance[cell[:, 0], cell[:, 1]]
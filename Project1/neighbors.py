@@ -0,0 +1,300 @@
+import numpy as NP
+from scipy.spatial import cKDTree
+
+def wrap(pos, boardDimension):
+    """Positions folded into [0, boardDimension), as step() does with %"""
+    pos = pos % boardDimension
+    # tiny negative values round up to boardDimension itself
+    pos[pos >= boardDimension] = 0.0
+    return pos
+
+def pairDistances(pos, i, j, radius, boxSize=None):
+    """Displacement pos[i] - pos[j] and distance for candidate pairs, keeping those closer than radius.
+
+    With a boxSize the displacement is taken to the nearest periodic image.
+    """
+    delta = pos[i] - pos[j]
+    if boxSize is not None:
+        delta -= boxSize * NP.round(delta / boxSize)
+    d = NP.sqrt((delta ** 2).sum(axis=1))
+    inside = d < radius
+    return i[inside], j[inside], delta[inside], d[inside]
+
+def runOffsets(counts):
+    """Position of every element inside its run, for runs of the given lengths laid end to end"""
+    return NP.arange(counts.sum()) - NP.repeat(NP.cumsum(counts) - counts, counts)
+
+def expandRuns(start, counts):
+    """The ranges start[k], ..., start[k] + counts[k] - 1 concatenated"""
+    return NP.repeat(start, counts) + runOffsets(counts)
+
+def closestPerRow(i, d):
+    """Index of the pair with the smallest d for every distinct row i"""
+    order = NP.lexsort((d, i))
+    first = NP.ones(len(order), dtype=bool)
+    first[1:] = i[order][1:] != i[order][:-1]
+    return order[first]
+
+def cellPairs(cell, cells, cellStart, cellEnd, order, offsets=(-1, 0, 1), periodic=False):
+    """(row, member) pairs for the members filed in the cells around each row's cell.
+
+    cell holds the (x, y) cell of every row on a grid of cells (a number, or
+    one per axis); the members of the cell with key x * cells[1] + y are
+    order[cellStart[key]:cellEnd[key]]. With periodic=True the neighboring
+    cells wrap around the grid.
+    """
+    cells = NP.broadcast_to(cells, 2)
+    row = NP.arange(len(cell))
+    rows, cols = [], []
+    for dx in offsets:
+        for dy in offsets:
+            nb = cell + [dx, dy]
+            if periodic:
+                nb %= cells
+            valid = ((nb >= 0) & (nb < cells)).all(axis=1)
+            key = nb[valid, 0] * cells[1] + nb[valid, 1]
+            start = cellStart[key]
+            counts = cellEnd[key] - start
+            if counts.sum() == 0:
+                continue
+            rows.append(NP.repeat(row[valid], counts))
+            cols.append(order[expandRuns(start, counts)])
+    if not rows:
+        return NP.zeros(0, dtype=int), NP.zeros(0, dtype=int)
+    return NP.concatenate(rows), NP.concatenate(cols)
+
+def withinRadius(pairs, radius):
+    """Subset of cached (i, j, delta, d) pairs closer than radius"""
+    i, j, delta, d = pairs
+    inside = d < radius
+    return i[inside], j[inside], delta[inside], d[inside]
+
+class NeighborIndex:
+    """Base of the neighbor indices: the agents of the last build() and their pairs.
+
+    build() takes the positions of this step; query(radius) returns the
+    pairs within radius, searched on the first query and filtered for the
+    others, for any radius up to the index radius cellSize.
+    """
+
+    def __init__(self, cellSize, boardDimension, periodic=False):
+        self.cellSize = float(cellSize)
+        self.boardDimension = boardDimension
+        self.periodic = periodic
+        self.clear()
+
+    def clear(self):
+        """Forget the current agents; build() must be called before the next query"""
+        self.pos = None
+        # pairs whose distance was computed by the last search, for profiling
+        self.candidateCount = 0
+        self.pairs = None
+
+    @property
+    def built(self):
+        return self.pos is not None
+
+    def build(self, pos):
+        self.pos = pos
+        self.pairs = None
+        self.candidateCount = 0
+
+    def checkRadius(self, radius):
+        if radius > self.cellSize:
+            raise ValueError("query radius %s is larger than the index radius %s" % (radius, self.cellSize))
+
+class SpatialHash(NeighborIndex):
+    """Uniform grid of square buckets used to find nearby agents.
+
+    The board is cut into cells of side cellSize, which must be at least the
+    largest radius that will be queried (max of flockRadius and
+    avoidanceRadius). Two agents closer than cellSize are then always in the
+    same or adjacent cells, so a query only looks at the 3x3 block of cells
+    around each agent. Call build() once per step, then query() any number
+    of radii; candidate pairs are computed on the first query and filtered
+    for the others.
+
+    With periodic=True the board wraps around like step() does, so cells on
+    opposite edges are adjacent and displacements use the nearest image.
+    """
+
+    def __init__(self, cellSize, boardDimension, periodic=False):
+        super().__init__(cellSize, boardDimension, periodic)
+        if periodic:
+            # cells at least cellSize wide that tile the board exactly, so the
+            # cells on opposite edges really are adjacent across the wrap
+            self.cells = max(1, int(NP.floor(boardDimension / self.cellSize)))
+        else:
+            self.cells = max(1, int(NP.ceil(boardDimension / self.cellSize)))
+        self.width = boardDimension / float(self.cells) if periodic else self.cellSize
+
+    def build(self, pos):
+        """Bucket agents by cell; agents off the board go to the edge cells"""
+        super().build(pos)
+        if self.periodic:
+            pos = wrap(pos, self.boardDimension)
+        self.cell = NP.clip(NP.floor(pos / self.width).astype(int), 0, self.cells - 1)
+        key = self.cell[:, 0] * self.cells + self.cell[:, 1]
+        self.order = NP.argsort(key, kind='stable')
+        sortedKey = key[self.order]
+        allKeys = NP.arange(self.cells * self.cells)
+        self.cellStart = NP.searchsorted(sortedKey, allKeys, 'left')
+        self.cellEnd = NP.searchsorted(sortedKey, allKeys, 'right')
+
+    def candidates(self):
+        """Every ordered pair (i, j), i != j, of agents in the same or adjacent cells"""
+        offsets = (-1, 0, 1)
+        if self.periodic:
+            # on boards of one or two cells some offsets reach the same cell
+            offsets = sorted(set(o % self.cells for o in offsets))
+        i, j = cellPairs(self.cell, self.cells, self.cellStart, self.cellEnd, self.order,
+                         offsets, self.periodic)
+        notSelf = i != j
+        self.candidateCount = int(notSelf.sum())
+        return i[notSelf], j[notSelf]
+
+    def query(self, radius):
+        """Pairs closer than radius as (i, j, pos[i] - pos[j], distance)"""
+        self.checkRadius(radius)
+        if self.pairs is None:
+            i, j = self.candidates()
+            self.pairs = pairDistances(self.pos, i, j, self.cellSize,
+                                       self.boardDimension if self.periodic else None)
+        return withinRadius(self.pairs, radius)
+
+class KDTreeIndex(NeighborIndex):
+    """Neighbor index backed by one scipy cKDTree per step.
+
+    The tree answers the largest radius (cellSize) for every agent in one
+    batched query_pairs call; smaller radii are filtered from that result.
+    With periodic=True the tree is built with boxsize=boardDimension so
+    distances wrap around the board like step() does.
+    """
+
+    def clear(self):
+        super().clear()
+        self.tree = None
+
+    def build(self, pos):
+        super().build(pos)
+        if self.periodic:
+            self.tree = cKDTree(wrap(pos, self.boardDimension), boxsize=self.boardDimension)
+        else:
+            self.tree = cKDTree(pos)
+
+    def query(self, radius):
+        """Pairs closer than radius as (i, j, pos[i] - pos[j], distance)"""
+        self.checkRadius(radius)
+        if self.pairs is None:
+            half = self.tree.query_pairs(self.cellSize, output_type='ndarray')
+            # query_pairs lists each pair once with i < j
+            i = NP.concatenate([half[:, 0], half[:, 1]])
+            j = NP.concatenate([half[:, 1], half[:, 0]])
+            self.candidateCount = len(i)
+            self.pairs = pairDistances(self.pos, i, j, self.cellSize,
+                                       self.boardDimension if self.periodic else None)
+        return withinRadius(self.pairs, radius)
+
+class BruteForceIndex(NeighborIndex):
+    """Reference index comparing every pair of agents.
+
+    Slow for big flocks, but it is the definition the other backends must
+    match, so use it to check results and to find where they start to pay off.
+    """
+
+    # upper bound on the number of pair distances held in memory at once
+    chunkSize = 2**22
+
+    def query(self, radius):
+        """Pairs closer than radius as (i, j, pos[i] - pos[j], distance)"""
+        self.checkRadius(radius)
+        if self.pairs is None:
+            n = len(self.pos)
+            boxSize = self.boardDimension if self.periodic else None
+            self.candidateCount = n * (n - 1)
+            rows, cols, deltas, dists = [], [], [], []
+            block = max(1, self.chunkSize // max(1, n))
+            for start in range(0, n, block):
+                i = NP.repeat(NP.arange(start, min(n, start + block)), n)
+                j = NP.tile(NP.arange(n), min(n, start + block) - start)
+                notSelf = i != j
+                i, j, delta, d = pairDistances(self.pos, i[notSelf], j[notSelf], self.cellSize, boxSize)
+                rows.append(i)
+                cols.append(j)
+                deltas.append(delta)
+                dists.append(d)
+            if rows:
+                self.pairs = (NP.concatenate(rows), NP.concatenate(cols),
+                              NP.concatenate(deltas), NP.concatenate(dists))
+            else:
+                self.pairs = (NP.zeros(0, dtype=int), NP.zeros(0, dtype=int),
+                              NP.zeros((0, 2)), NP.zeros(0))
+        return withinRadius(self.pairs, radius)
+
+class VerletList(NeighborIndex):
+    """Neighbor list with a skin, reused for as long as agents stay near where it was built.
+
+    The wrapped index (any backend above, made with radius cellSize + skin)
+    lists every pair within that larger radius. Until some agent has moved
+    more than skin / 2 since then, no pair that was further apart can have
+    come within cellSize, so build() only recomputes the distances of the
+    listed pairs instead of searching again. Agents that move little per
+    step (boids move newVel * 0.2) keep one list for many steps.
+    """
+
+    def __init__(self, inner, cellSize, skin):
+        self.inner = inner
+        self.skin = float(skin)
+        # full searches so far, for profiling
+        self.rebuilds = 0
+        super().__init__(cellSize, inner.boardDimension, inner.periodic)
+
+    def clear(self):
+        """Forget the current agents and the list; the next build() searches again"""
+        super().clear()
+        self.listed = None
+        self.listedPos = None
+        self.inner.clear()
+
+    def moved(self, pos):
+        """Largest distance any agent has moved since the list was built"""
+        delta = pos - self.listedPos
+        if self.periodic:
+            delta -= self.boardDimension * NP.round(delta / self.boardDimension)
+        return NP.sqrt((delta ** 2).sum(axis=1)).max() if len(delta) else 0.0
+
+    def build(self, pos):
+        super().build(pos)
+        if (self.listed is None or len(pos) != len(self.listedPos)
+                or self.moved(pos) > self.skin / 2):
+            self.inner.build(pos)
+            i, j, delta, d = self.inner.query(self.inner.cellSize)
+            self.listed = (i, j)
+            # pos is a buffer the flock overwrites, keep our own copy
+            self.listedPos = pos.copy()
+            self.rebuilds += 1
+
+    def query(self, radius):
+        """Pairs closer than radius as (i, j, pos[i] - pos[j], distance)"""
+        self.checkRadius(radius)
+        if self.pairs is None:
+            i, j = self.listed
+            self.candidateCount = len(i)
+            self.pairs = pairDistances(self.pos, i, j, self.cellSize,
+                                       self.boardDimension if self.periodic else None)
+        return withinRadius(self.pairs, radius)
+
+# neighbor backends by name, all built as backend(cellSize, boardDimension, periodic)
+backends = {'brute': BruteForceIndex, 'grid': SpatialHash, 'kdtree': KDTreeIndex}
+
+def makeIndex(backend, cellSize, boardDimension, periodic=False, skin=0):
+    """Create the neighbor index called `backend` ('brute', 'grid' or 'kdtree')
+
+    With a skin > 0 the index is wrapped in a VerletList searching
+    cellSize + skin, so it is only rebuilt after agents have moved.
+    """
+    if backend not in backends:
+        raise ValueError("unknown neighbor backend %r, expected one of %s" % (backend, sorted(backends)))
+    if skin > 0:
+        return VerletList(backends[backend](cellSize + skin, boardDimension, periodic), cellSize, skin)
+    return backends[backend](cellSize, boardDimension, periodic)
@@ -0,0 +1,146 @@
+import numpy as NP
+from scipy import ndimage
+
+from neighbors import cellPairs, closestPerRow, runOffsets
+
+class DistanceField:
+    """Distance to the nearest wall, precomputed over the whole board.
+
+    Wall points are rasterized onto a grid of nodes spaced `resolution`
+    apart covering [0, boardDimension] in both directions. An exact Euclidean
+    distance transform then gives, for every node, the distance to the
+    closest wall node and the unit gradient pointing away from it. Looking up
+    an agent is a bilinear interpolation of the four surrounding nodes, so
+    the cost per step no longer depends on how many wall points there are.
+    """
+
+    def __init__(self, walls, boardDimension, resolution=1.0):
+        self.boardDimension = boardDimension
+        self.resolution = float(resolution)
+        self.nodes = int(NP.ceil(boardDimension / self.resolution)) + 1
+        walls = NP.asarray(walls, dtype=float).reshape(-1, 2)
+        blocked = NP.zeros((self.nodes, self.nodes), dtype=bool)
+        cell = NP.rint(walls / self.resolution).astype(int)
+        onBoard = ((cell >= 0) & (cell < self.nodes)).all(axis=1)
+        blocked[cell[onBoard, 0], cell[onBoard, 1]] = True
+        if not blocked.any():
+            # no walls: everything is infinitely far away
+            self.distance = NP.full(blocked.shape, NP.inf)
+            self.gradient = NP.zeros(blocked.shape + (2,))
+            return
+        distance, nearest = ndimage.distance_transform_edt(~blocked, sampling=self.resolution,
+                                                           return_indices=True)
+        node = NP.indices(blocked.shape)
+        away = (node - nearest).transpose(1, 2, 0) * self.resolution
+        with NP.errstate(invalid='ignore', divide='ignore'):
+            gradient = away / distance[:, :, None]
+        gradient[distance == 0] = 0.0
+        self.distance = distance
+        self.gradient = gradient
+
+    def sample(self, pos):
+        """Bilinear interpolation of distance and gradient at each position"""
+        grid = NP.clip(NP.asarray(pos, dtype=float) / self.resolution, 0, self.nodes - 1)
+        base = NP.minimum(NP.floor(grid).astype(int), self.nodes - 2)
+        frac = grid - base
+        x0, y0 = base[:, 0], base[:, 1]
+        x1, y1 = x0 + 1, y0 + 1
+        fx, fy = frac[:, 0], frac[:, 1]
+        w00 = (1 - fx) * (1 - fy)
+        w10 = fx * (1 - fy)
+        w01 = (1 - fx) * fy
+        w11 = fx * fy
+        f = self.distance
+        d = w00 * f[x0, y0] + w10 * f[x1, y0] + w01 * f[x0, y1] + w11 * f[x1, y1]
+        g = self.gradient
+        grad = (w00[:, None] * g[x0, y0] + w10[:, None] * g[x1, y0]
+                + w01[:, None] * g[x0, y1] + w11[:, None] * g[x1, y1])
+        return d, grad
+
+    def nearest(self, pos):
+        """Displacement from the closest wall to each position, and its length"""
+        d, grad = self.sample(pos)
+        norm = NP.sqrt((grad ** 2).sum(axis=1))
+        with NP.errstate(invalid='ignore', divide='ignore'):
+            grad = NP.where(norm[:, None] > 0, grad / norm[:, None], 0.0)
+        return grad * d[:, None], d
+
+def segmentDistances(pos, start, end):
+    """Displacement from the closest point of each segment start-end to pos, and its length"""
+    ab = end - start
+    length2 = (ab ** 2).sum(axis=1)
+    with NP.errstate(invalid='ignore', divide='ignore'):
+        t = ((pos - start) * ab).sum(axis=1) / length2
+    # zero-length segments are points
+    t = NP.clip(NP.nan_to_num(t), 0, 1)
+    delta = pos - (start + t[:, None] * ab)
+    return delta, NP.sqrt((delta ** 2).sum(axis=1))
+
+class SegmentGrid:
+    """Exact distance to line-segment walls through a uniform grid of buckets.
+
+    Segments are cut into pieces no longer than cellSize and each piece is
+    filed under every cell its bounding box touches. A wall closer than
+    cellSize to an agent then always has a piece in the agent's cell or one
+    of the 8 around it, so a lookup only measures the few pieces in that
+    3x3 block: the cost does not grow with the number of walls, and there
+    are no gaps between sample points. Walls further than cellSize away
+    are reported at distance inf, which is all avoidObstacles needs as long
+    as cellSize is at least avoidanceRadius.
+    """
+
+    def __init__(self, segments, cellSize):
+        self.cellSize = float(cellSize)
+        segments = NP.asarray(segments, dtype=float).reshape(-1, 4)
+        start, end = segments[:, :2], segments[:, 2:]
+        length = NP.sqrt(((end - start) ** 2).sum(axis=1))
+        pieces = NP.maximum(1, NP.ceil(length / self.cellSize)).astype(int)
+        owner = NP.repeat(NP.arange(len(segments)), pieces)
+        part = runOffsets(pieces)
+        ab = (end - start)[owner] / pieces[owner, None]
+        self.start = start[owner] + part[:, None] * ab
+        self.end = self.start + ab
+        self.segments = segments
+        if not len(self.start):
+            self.origin = NP.zeros(2, dtype=int)
+            self.cells = NP.ones(2, dtype=int)
+            self.cellStart = NP.zeros(2, dtype=int)
+            self.order = NP.zeros(0, dtype=int)
+            return
+        low = NP.floor(NP.minimum(self.start, self.end) / self.cellSize).astype(int)
+        high = NP.floor(NP.maximum(self.start, self.end) / self.cellSize).astype(int)
+        self.origin = low.min(axis=0)
+        self.cells = high.max(axis=0) - self.origin + 1
+        low -= self.origin
+        high -= self.origin
+        # a piece spans at most two cells along each axis
+        keys, ids = [], []
+        for dx in (0, 1):
+            for dy in (0, 1):
+                cell = low + [dx, dy]
+                valid = (cell <= high).all(axis=1)
+                keys.append(cell[valid, 0] * self.cells[1] + cell[valid, 1])
+                ids.append(NP.nonzero(valid)[0])
+        key = NP.concatenate(keys)
+        order = NP.argsort(key, kind='stable')
+        self.order = NP.concatenate(ids)[order]
+        self.cellStart = NP.searchsorted(key[order], NP.arange(self.cells.prod() + 1), 'left')
+
+    def candidates(self, pos):
+        """(agent, piece) pairs with the piece filed in the 3x3 cells around the agent"""
+        cell = NP.floor(pos / self.cellSize).astype(int) - self.origin
+        return cellPairs(cell, self.cells, self.cellStart, self.cellStart[1:], self.order)
+
+    def nearest(self, pos):
+        """Displacement from the closest wall to each position, and its length"""
+        pos = NP.asarray(pos, dtype=float).reshape(-1, 2)
+        delta = NP.zeros_like(pos)
+        d = NP.full(len(pos), NP.inf)
+        i, j = self.candidates(pos)
+        if len(i):
+            pairDelta, pairD = segmentDistances(pos[i], self.start[j], self.end[j])
+            # closest piece per agent; a piece in two cells appears twice
+            closest = closestPerRow(i, pairD)
+            delta[i[closest]] = pairDelta[closest]
+            d[i[closest]] = pairD[closest]
+        return delta, d
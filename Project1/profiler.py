@@ -0,0 +1,133 @@
+from collections import deque
+import csv
+import json
+import time as clock
+
+class _NoTimer:
+    """Context manager that does nothing, shared by NullProfiler"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every call is a no-op"""
+
+    enabled = False
+    _timer = _NoTimer()
+
+    def beginStep(self, step):
+        pass
+
+    def endStep(self):
+        pass
+
+    def section(self, name):
+        return self._timer
+
+    def count(self, name, n):
+        pass
+
+class _Timer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = clock.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._add(self.name, clock.perf_counter() - self.start)
+        return False
+
+class StepProfiler:
+    """Wall time and call counts of each part of a model step.
+
+    The model wraps each steering rule in `with profiler.section(name):` and
+    reports counters such as neighbor candidates with count(). Totals are
+    kept for the whole run and one row per step, bracketed by
+    beginStep()/endStep(); with keepSteps only the rows of the last
+    keepSteps steps are kept, so memory stays bounded however long the run.
+    The cost is two perf_counter calls per section, so it can stay on for
+    long runs. Export with toCSV() or toJSON().
+    """
+
+    enabled = True
+
+    def __init__(self, keepSteps=None):
+        self.seconds = {}
+        self.calls = {}
+        self.counts = {}
+        self.steps = deque(maxlen=keepSteps)
+        # over every step, including the rows steps no longer holds
+        self.stepCount = 0
+        self.stepSeconds = 0.0
+        self.current = None
+
+    def beginStep(self, step):
+        self.current = {'step': step}
+        self._stepStart = clock.perf_counter()
+
+    def endStep(self):
+        if self.current is not None:
+            total = clock.perf_counter() - self._stepStart
+            self.current['total'] = total
+            self.steps.append(self.current)
+            self.stepCount += 1
+            self.stepSeconds += total
+            self.current = None
+
+    def section(self, name):
+        return _Timer(self, name)
+
+    def _add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.current is not None:
+            self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def count(self, name, n):
+        """Add n to counter `name`, e.g. the neighbor candidates examined"""
+        self.counts[name] = self.counts.get(name, 0) + n
+        if self.current is not None:
+            self.current[name] = self.current.get(name, 0) + n
+
+    def summary(self):
+        """Cumulative seconds, calls and mean milliseconds per call of each section"""
+        return {
+            'steps': self.stepCount,
+            'stepSeconds': self.stepSeconds,
+            'sections': dict((name, {'seconds': self.seconds[name],
+                                     'calls': self.calls[name],
+                                     'meanMs': 1000 * self.seconds[name] / self.calls[name]})
+                             for name in self.seconds),
+            'counts': dict(self.counts),
+        }
+
+    def toJSON(self, path):
+        """Write the summary and the kept per-step rows as JSON"""
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'perStep': list(self.steps)}, f)
+
+    def toCSV(self, path):
+        """Write one row per kept step: step, total, then every section and counter"""
+        names = []
+        for row in self.steps:
+            for name in row:
+                if name not in names and name not in ('step', 'total'):
+                    names.append(name)
+        with open(path, 'w', newline='') as f:
+            wr = csv.writer(f)
+            wr.writerow(['step', 'total'] + names)
+            for row in self.steps:
+                wr.writerow([row['step'], row['total']] + [row.get(name, 0) for name in names])
+
+    def save(self, path):
+        """toCSV() for .csv paths, toJSON() otherwise"""
+        if path.endswith('.csv'):
+            self.toCSV(path)
+        else:
+            self.toJSON(path)
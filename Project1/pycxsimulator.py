@@ -29,6 +29,10 @@ import matplotlib.backends.backend_qt4agg as backend
 
 from tkinter import *
 from tkinter.ttk import Notebook
+import sys
+import threading
+import time
+import traceback
  
 
 
@@ -41,11 +45,24 @@ class GUI:
     modelFigure = None
     stepSize = 1
     currentStep = 0
-    def __init__(self,title='PyCX Simulator',interval=0,stepSize=1,parameterSetters=[]):
+    ## threaded mode: the model steps in a worker thread and the GUI draws
+    ## the newest published snapshot every frameInterval milliseconds
+    threaded = False
+    frameInterval = 40
+    def __init__(self,title='PyCX Simulator',interval=0,stepSize=1,parameterSetters=[],threaded=False,frameInterval=40):
         self.titleText = title
         self.timeInterval = interval
         self.stepSize = stepSize
         self.parameterSetters = parameterSetters
+        self.threaded = threaded
+        self.frameInterval = frameInterval
+        self.modelLock = threading.Lock()
+        self.worker = None
+        self.latest = None
+        self.drawnStep = None
+        # (exception, traceback text) of a step that raised in the worker
+        self.workerError = None
+        self.modelSnapshotFunc = None
         self.varEntries = {}
         self.statusStr = ""        
         self.initGUI()
@@ -155,8 +172,14 @@ class GUI:
 
     def runEvent(self):
         self.running = not self.running
-        if self.running:
+        if self.running and self.threaded:
+            self.worker = threading.Thread(target=self.workerLoop,name='model-worker')
+            self.worker.daemon = True
+            self.worker.start()
+            self.rootWindow.after(self.frameInterval,self.pollModel)
+        elif self.running:
             self.rootWindow.after(self.timeInterval,self.stepModel)
+        if self.running:
             self.runPauseString.set("Pause")
             self.buttonStep.configure(state=DISABLED)
             self.buttonReset.configure(state=DISABLED)
@@ -164,6 +187,10 @@ class GUI:
                 self.buttonSaveParameters.configure(state=NORMAL)
                 self.buttonSaveParametersAndReset.configure(state=DISABLED)     
         else:
+            if self.threaded:
+                # let the worker finish its step, then show where it stopped
+                self.stopWorker()
+                self.pollModel()
             self.runPauseString.set("Continue Run")
             self.buttonStep.configure(state=NORMAL)
             self.buttonReset.configure(state=NORMAL)
@@ -181,8 +208,56 @@ class GUI:
                 self.drawModel()
             self.rootWindow.after(int(self.timeInterval*1.0/self.stepSize),self.stepModel)
 
-    def stepOnce(self):
+    def workerLoop(self):
+        # runs off the Tk thread: never touch widgets here, only publish
+        while self.running:
+            with self.modelLock:
+                if not self.running:
+                    break
+                try:
+                    self.modelStepFunc()
+                    self.currentStep += 1
+                    snapshot = self.modelSnapshotFunc() if self.modelSnapshotFunc else None
+                except Exception as e:
+                    # hand it to pollModel, which stops the run on the Tk thread
+                    self.workerError = (e,traceback.format_exc())
+                    break
+                self.latest = (self.currentStep,snapshot)
+            if self.timeInterval > 0:
+                time.sleep(self.timeInterval/1000.0)
+
+    def pollModel(self):
+        if self.workerError is not None:
+            error,trace = self.workerError
+            self.workerError = None
+            sys.stderr.write(trace)
+            if self.running:
+                self.runEvent()
+            self.setStatusStr("Step "+str(self.currentStep+1)+" failed: "+type(error).__name__+": "+str(error))
+            self.status.configure(foreground='red')
+            return
+        latest = self.latest
+        if latest is not None and latest[0] != self.drawnStep:
+            self.drawnStep = latest[0]
+            self.setStatusStr("Step "+str(latest[0]))
+            self.status.configure(foreground='black')
+            if latest[1] is not None:
+                self.drawModel(latest[1])
+            else:
+                # no snapshot function: draw the live model between two steps
+                with self.modelLock:
+                    self.drawModel()
+        if self.running:
+            self.rootWindow.after(self.frameInterval,self.pollModel)
+
+    def stopWorker(self):
         self.running = False
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+    def stepOnce(self):
+        self.stopWorker()
         self.runPauseString.set("Continue Run")
         self.modelStepFunc()
         self.currentStep += 1
@@ -192,22 +267,28 @@ class GUI:
             self.buttonSaveParameters.configure(state=NORMAL)
 
     def resetModel(self):
-        self.running = False        
+        self.stopWorker()
         self.runPauseString.set("Run")
         self.modelInitFunc()
         self.currentStep = 0;
         self.setStatusStr("Model has been reset")
         self.drawModel()
 
-    def drawModel(self):
+    def drawModel(self,snapshot=None):
         
         if self.modelFigure == None or self.modelFigure.canvas.manager.window == None:
             self.modelFigure = plt.figure(figsize=(6,4))
             plt.ion()
-        self.modelDrawFunc()
+        if snapshot is None:
+            self.modelDrawFunc()
+        else:
+            self.modelDrawFunc(snapshot)
         self.modelFigure.canvas.manager.window.update()
 
-    def start(self,func=[]):
+    def start(self,func=[],snapshot=None):
+        # snapshot (threaded mode only) is called by the worker after each
+        # step and must return a copy of the state; draw(state) then renders it
+        self.modelSnapshotFunc = snapshot
         if len(func)==3:
             self.modelInitFunc = func[0]
             self.modelDrawFunc = func[1]
@@ -226,6 +307,7 @@ class GUI:
         self.rootWindow.mainloop()
 
     def quitGUI(self):
+        self.stopWorker()
         plt.close('all')
         self.rootWindow.quit()
         self.rootWindow.destroy()
@@ -242,3 +324,81 @@ class GUI:
             self.status.configure(foreground='black')
         widget.bind("<Enter>", lambda e : setText(self))
         widget.bind("<Leave>", lambda e : showHelpLeave(self))
+
+
+class BlitRenderer:
+    """Incremental drawing of agent positions for model draw() functions.
+
+    Instead of PL.cla() and re-plotting everything on each redraw, the
+    static layers (e.g. walls) are drawn once into a saved background. Each
+    redraw restores that background, moves the agent markers with set_data
+    and blits the figure. A full redraw (window resize, new figure) captures
+    the background again. Backends without blitting fall back to draw_idle.
+    Models keep one in a module-level renderer, created on the first draw.
+    """
+
+    def __init__(self,boardDimension,agentStyle='bo',markerSize=6):
+        self.boardDimension = boardDimension
+        self.agentStyle = agentStyle
+        self.markerSize = markerSize
+        self.figure = None
+        self.static = None
+        self.background = None
+        # draw_event connection, replaced on every setup
+        self.drawCanvas = None
+        self.drawCid = None
+
+    def setup(self,static):
+        self.figure = plt.gcf()
+        self.axes = self.figure.gca()
+        self.axes.cla()
+        self.static = static
+        for points,style in static or []:
+            self.axes.plot(points[:,0],points[:,1],style)
+        blit = getattr(self.figure.canvas,'supports_blit',False)
+        self.agents, = self.axes.plot([],[],self.agentStyle,markersize=self.markerSize,animated=blit)
+        self.title = self.axes.set_title('',animated=blit)
+        self.axes.axis('scaled')
+        self.axes.axis([0,self.boardDimension,0,self.boardDimension])
+        self.background = None
+        if self.drawCid is not None:
+            self.drawCanvas.mpl_disconnect(self.drawCid)
+        self.drawCanvas = self.figure.canvas
+        self.drawCid = self.drawCanvas.mpl_connect('draw_event',self.onDraw)
+        self.figure.canvas.draw()
+
+    def sameStatic(self,static):
+        old = self.static or []
+        new = static or []
+        return len(old) == len(new) and all(a[0] is b[0] and a[1] == b[1] for a,b in zip(old,new))
+
+    def onDraw(self,event):
+        # a full redraw has just happened: keep it as the new background
+        canvas = self.figure.canvas
+        if getattr(canvas,'supports_blit',False):
+            self.background = canvas.copy_from_bbox(self.figure.bbox)
+            self.drawAnimated()
+
+    def drawAnimated(self):
+        self.axes.draw_artist(self.agents)
+        self.axes.draw_artist(self.title)
+
+    def draw(self,x,y,title='',static=None):
+        """Show agents at (x, y).
+
+        static is a list of (points, style) layers, points an (M, 2) array;
+        they are drawn once and again only when a different array is passed.
+        """
+        if (self.figure is None or self.figure is not plt.gcf() or not self.sameStatic(static)
+                or self.agents.axes is None):
+            self.setup(static)
+        self.agents.set_data(x,y)
+        self.title.set_text(title)
+        canvas = self.figure.canvas
+        if self.background is None:
+            canvas.draw_idle()
+        else:
+            canvas.restore_region(self.background)
+            self.drawAnimated()
+            canvas.blit(self.figure.bbox)
+        canvas.flush_events()
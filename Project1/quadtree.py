@@ -0,0 +1,169 @@
+"""Barnes-Hut style quadtree for the flocking sums of getFlock.
+
+Agent.getFlock adds up the location and velocity of every agent within
+flockRadius. For large radii (or whole-board cohesion) that is a huge
+number of pairs. The tree instead stores, for each cell, the number of
+agents and the sum of their positions and velocities. A cell lying wholly
+inside an agent's radius is added in one go; a cell far away compared to
+its size (width < theta * distance to its mass center) and cut by the
+radius edge is not opened: it contributes its sums scaled by the estimated
+share of it inside the radius. Only cells straddling the edge close by
+are opened, down to leaves whose agents are compared one by one. Cells
+wholly inside are always exact, so theta = 0 gives the exact sums.
+
+The tree is sparse: level L is the 2**L x 2**L grid over the board, but
+only occupied cells are stored, and levels are added until every cell
+holds at most leafSize agents. Traversal goes level by level over all
+(agent, cell) pairs at once, so there is no per-agent Python loop.
+"""
+import numpy as NP
+
+from neighbors import expandRuns, wrap
+
+class _Level:
+    """Occupied cells of one level: sorted keys, agent counts and sums"""
+
+    def __init__(self, cells, width, key, pos, vel):
+        self.cells = cells
+        self.width = width
+        self.order = NP.argsort(key, kind='stable')
+        self.keys, self.start, self.count = NP.unique(key[self.order], return_index=True, return_counts=True)
+        cell = NP.searchsorted(self.keys, key)
+        self.sumPos = NP.stack([NP.bincount(cell, weights=pos[:, a], minlength=len(self.keys)) for a in range(2)], axis=1)
+        self.sumVel = NP.stack([NP.bincount(cell, weights=vel[:, a], minlength=len(self.keys)) for a in range(2)], axis=1)
+
+class QuadTree:
+    """Approximate getFlock sums in O(N log N); set as Flock.farField to use it.
+
+    With periodic=True the board wraps around: cells and agents are seen
+    at their nearest image, which requires the radius to stay below half
+    the board.
+    """
+
+    def __init__(self, boardDimension, theta=0.5, leafSize=16, periodic=False, maxDepth=16):
+        self.boardDimension = boardDimension
+        self.theta = theta
+        self.leafSize = leafSize
+        self.periodic = periodic
+        self.maxDepth = maxDepth
+        self.levels = []
+        # (agent, cell) pairs and agent pairs evaluated by the last flockSums, for profiling
+        self.interactions = 0
+
+    def build(self, pos, vel):
+        """Bucket agents into levels until no cell holds more than leafSize"""
+        self.pos = pos
+        self.vel = vel
+        self.levels = []
+        if not len(pos):
+            return
+        if self.periodic:
+            base = wrap(pos, self.boardDimension)
+            self.origin = NP.zeros(2)
+            self.size = float(self.boardDimension)
+        else:
+            base = pos
+            self.origin = pos.min(axis=0)
+            # a square a bit larger than the flock, so no agent sits on its far edge
+            self.size = max(float(NP.ptp(pos, axis=0).max()), 1e-9) * (1 + 1e-9)
+        scaled = (base - self.origin) / self.size
+        for depth in range(self.maxDepth + 1):
+            cells = 2 ** depth
+            c = NP.clip(NP.floor(scaled * cells).astype(NP.int64), 0, cells - 1)
+            level = _Level(cells, self.size / cells, c[:, 0] * cells + c[:, 1], base, vel)
+            self.levels.append(level)
+            if level.count.max() <= self.leafSize:
+                break
+
+    def _nearest(self, delta):
+        if self.periodic:
+            delta = delta - self.boardDimension * NP.round(delta / self.boardDimension)
+        return delta
+
+    def flockSums(self, radius):
+        """Summed location (nearest images) and velocity of the agents within radius of each agent, self included"""
+        pos = self.pos
+        n = len(pos)
+        avgLoc = NP.zeros((n, 2))
+        avgVel = NP.zeros((n, 2))
+        self.interactions = 0
+        if not n:
+            return avgLoc, avgVel
+        base = wrap(pos, self.boardDimension) if self.periodic else pos
+        agent = NP.arange(n)
+        cell = NP.zeros(n, dtype=int)
+
+        def add(who, loc, vel):
+            for a in range(2):
+                avgLoc[:, a] += NP.bincount(who, weights=loc[:, a], minlength=n)
+                avgVel[:, a] += NP.bincount(who, weights=vel[:, a], minlength=n)
+
+        for depth, level in enumerate(self.levels):
+            if not len(agent):
+                break
+            self.interactions += len(agent)
+            key = level.keys[cell]
+            corner = NP.stack([key // level.cells, key % level.cells], axis=1)
+            center = self.origin + (corner + 0.5) * level.width
+            delta = self._nearest(base[agent] - center)
+            # shift from the cell's own frame to its image nearest the agent,
+            # in the agent's frame (pos, which need not lie on the board), as
+            # the leaf pairs and Flock.getFlock see it
+            offset = (self.pos[agent] - delta) - center
+            gap = NP.maximum(NP.abs(delta) - level.width / 2, 0)
+            nearD = NP.sqrt((gap ** 2).sum(axis=1))
+            farD = NP.sqrt(((NP.abs(delta) + level.width / 2) ** 2).sum(axis=1))
+            count = level.count[cell]
+
+            whole = farD < radius
+            open_ = ~whole & (nearD < radius)
+            # mass center test, never for the cell holding the agent itself
+            com = level.sumPos[cell] / count[:, None]
+            comD = NP.sqrt((self._nearest(base[agent] - com) ** 2).sum(axis=1))
+            far = open_ & (nearD > 0) & (level.width < self.theta * comD)
+            open_ &= ~far
+            if whole.any():
+                add(agent[whole], level.sumPos[cell[whole]] + count[whole, None] * offset[whole],
+                    level.sumVel[cell[whole]])
+            if far.any():
+                # a far cell cut by the radius counts with the share of it
+                # inside, ramping from 0 to 1 as its mass center crosses in
+                share = NP.clip((radius - comD[far]) / level.width + 0.5, 0, 1)[:, None]
+                add(agent[far], share * (level.sumPos[cell[far]] + count[far, None] * offset[far]),
+                    share * level.sumVel[cell[far]])
+
+            last = depth == len(self.levels) - 1
+            leaf = open_ & (last | (count <= self.leafSize))
+            if leaf.any():
+                self._leafPairs(agent[leaf], cell[leaf], level, base, add, radius)
+
+            expand = open_ & ~leaf
+            if last or not expand.any():
+                break
+            agent, cell = self._children(agent[expand], key[expand], level, self.levels[depth + 1])
+        return avgLoc, avgVel
+
+    def _leafPairs(self, agent, cell, level, base, add, radius):
+        """Exact sums over the members of leaf cells"""
+        start = level.start[cell]
+        counts = level.count[cell]
+        i = NP.repeat(agent, counts)
+        j = level.order[expandRuns(start, counts)]
+        self.interactions += len(i)
+        delta = self._nearest(base[i] - base[j])
+        inside = (delta ** 2).sum(axis=1) < radius * radius
+        i, j = i[inside], j[inside]
+        add(i, self.pos[i] - delta[inside], self.vel[j])
+
+    def _children(self, agent, key, level, below):
+        """(agent, cell) pairs for the occupied children of the given cells"""
+        cx, cy = key // level.cells, key % level.cells
+        agents, cells = [], []
+        for dx in (0, 1):
+            for dy in (0, 1):
+                child = (2 * cx + dx) * below.cells + 2 * cy + dy
+                k = NP.minimum(NP.searchsorted(below.keys, child), len(below.keys) - 1)
+                found = below.keys[k] == child
+                agents.append(agent[found])
+                cells.append(k[found])
+        return NP.concatenate(agents), NP.concatenate(cells)
@@ -0,0 +1,164 @@
+"""Offscreen frame recording for the Project1 models.
+
+Frames are rendered with the non-interactive Agg canvas (no pyplot, no
+GUI backend) into raw RGB buffers. A background thread encodes them, so
+step() never waits on PNG compression or on the video pipe. A bounded
+queue sits between the two; if the encoder falls behind, the simulation
+blocks only when the queue is full.
+
+    python recorder.py evacuation --every 5 --png frames/
+    python recorder.py evacuation --every 2 --video run.mp4 --set scenario=2
+"""
+import argparse
+import os
+import queue
+import subprocess
+import threading
+
+import numpy as NP
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import headless
+
+class PNGSink:
+    """Writes frame_000000.png, frame_000001.png, ... into a directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.count = 0
+
+    def write(self, frame):
+        from matplotlib import image
+        image.imsave(os.path.join(self.directory, 'frame_%06d.png' % self.count), frame)
+        self.count += 1
+
+    def close(self):
+        pass
+
+class VideoSink:
+    """Pipes raw RGB frames into ffmpeg, which encodes them into `path`"""
+
+    def __init__(self, path, width, height, fps=30, ffmpeg='ffmpeg'):
+        self.process = subprocess.Popen(
+            [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+             '-s', '%dx%d' % (width, height), '-r', str(fps), '-i', '-',
+             '-pix_fmt', 'yuv420p', path],
+            stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(NP.ascontiguousarray(frame).tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError("ffmpeg exited with status %d" % self.process.returncode)
+
+class FrameRecorder:
+    """Renders every k-th step offscreen and hands frames to an encoder thread.
+
+    Call capture(model) after each step; it rasterizes the model's walls
+    (if any) and agents on step numbers divisible by `every`. sink is a
+    PNGSink, a VideoSink, or anything with write(frame) and close().
+    """
+
+    def __init__(self, sink, boardDimension, every=1, size=(640, 640), dpi=100, backlog=64):
+        self.sink = sink
+        self.every = every
+        self.figure = Figure(figsize=(size[0] / float(dpi), size[1] / float(dpi)), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_axes([0, 0, 1, 1])
+        self.axes.set_xlim(0, boardDimension)
+        self.axes.set_ylim(0, boardDimension)
+        self.axes.set_axis_off()
+        self.wallLayer = None
+        self.wallPoints = None
+        self.agents, = self.axes.plot([], [], 'bo', markersize=3)
+        self.label = self.axes.text(0.01, 0.99, '', transform=self.axes.transAxes, va='top')
+        self.frames = queue.Queue(maxsize=backlog)
+        self.error = None
+        self.worker = threading.Thread(target=self.encode, name='frame-encoder')
+        self.worker.daemon = True
+        self.worker.start()
+
+    def encode(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            try:
+                self.sink.write(frame)
+            except Exception as e:
+                # keep draining so capture() never blocks; report on close()
+                self.error = e
+
+    def capture(self, model):
+        """Render the model's current state if this step is due"""
+        if model.time % self.every:
+            return
+        walls = getattr(model, 'walls', None)
+        if walls is not None and walls is not self.wallPoints:
+            if self.wallLayer is not None:
+                self.wallLayer.remove()
+            self.wallLayer, = self.axes.plot(walls[:, 0], walls[:, 1], 'rs', markersize=2)
+            self.wallPoints = walls
+        self.agents.set_data(model.flock.pos[:, 0], model.flock.pos[:, 1])
+        self.label.set_text('t = %d' % model.time)
+        self.canvas.draw()
+        # copy: the canvas buffer is reused by the next draw
+        frame = NP.array(self.canvas.buffer_rgba())[:, :, :3]
+        self.frames.put(frame)
+
+    def close(self):
+        """Wait for queued frames to be encoded and close the sink"""
+        self.frames.put(None)
+        self.worker.join()
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
+
+def record(modelName, steps, sink, every=1, params=None, seed=None, size=(640, 640)):
+    """Run a model headless for up to `steps` steps, recording every k-th one"""
+    model = headless.loadModel(modelName)
+    headless.configure(model, params or {})
+    if seed is not None:
+        headless.seedModel(seed)
+    model.init()
+    recorder = FrameRecorder(sink, model.boardDimension, every, size)
+    finished = getattr(model, 'finished', None)
+    try:
+        recorder.capture(model)
+        while model.time < steps and not (finished and finished()):
+            model.step()
+            recorder.capture(model)
+    finally:
+        recorder.close()
+    return model.time
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a headless model run to PNG frames or a video")
+    parser.add_argument('model', choices=headless.models)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--every', type=int, default=1, help='record every k-th step')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--set', nargs='*', default=[], type=headless.parseSetting, metavar='NAME=VALUE')
+    parser.add_argument('--size', type=int, default=640, help='frame width and height in pixels')
+    parser.add_argument('--fps', type=int, default=30)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--png', metavar='DIR', help='write a PNG sequence into DIR')
+    group.add_argument('--video', metavar='FILE', help='pipe frames to ffmpeg and write FILE')
+    args = parser.parse_args()
+
+    params = dict(args.set)
+
+    if args.png:
+        sink = PNGSink(args.png)
+    else:
+        sink = VideoSink(args.video, args.size, args.size, args.fps)
+    steps = record(args.model, args.steps, sink, args.every, params, args.seed, (args.size, args.size))
+    print("recorded %d steps" % steps)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Replay a recorded trajectory in the pycxsimulator GUI.
+
+Nothing is simulated: step() moves the frame cursor by `stride` frames
+(negative to rewind) and draw() shows the agents stored in that frame.
+Set startFrame and "Save parameters to the model and reset" to jump to
+any point of the run. Evacuation walls are rebuilt from the floor plan
+or scenario number in the trajectory header; a floor plan given after
+the trajectory replaces the recorded one, e.g. when it has been moved.
+
+    python replay.py run.trj
+    python replay.py run.trj floorplans/scenario2.json
+"""
+import os
+import sys
+
+from trajectory import TrajectoryReader
+
+trajectory = None
+walls = None
+
+# frame shown after a reset, and frames advanced per step
+startFrame = 0
+stride = 1
+
+renderer = None
+
+def startFrameF (val=startFrame):
+    """Frame to jump to.
+    The parameter change is effective only when model is reset.
+    """
+    global startFrame
+    startFrame = int(val)
+    return val
+
+def strideF (val=stride):
+    """Frames advanced per step; negative values play backwards.
+
+    The parameter can be changed in a running replay.
+    """
+    global stride
+    stride = int(val)
+    return val
+
+def load(path, floorPlan=None):
+    """Open a trajectory file and, for evacuation runs, rebuild its walls"""
+    global trajectory, walls
+    trajectory = TrajectoryReader(path)
+    walls = None
+    if trajectory.model == 'evacuation':
+        import evacuation
+        floorPlan = floorPlan or trajectory.floorPlan
+        if floorPlan and not os.path.exists(floorPlan):
+            raise IOError("%s was recorded with floor plan %s, which does not exist; "
+                          "give the plan after the trajectory" % (path, floorPlan))
+        evacuation.scenario = trajectory.scenario
+        evacuation.floorPlan = floorPlan
+        evacuation.boardDimension = trajectory.boardDimension
+        evacuation.init()
+        walls = evacuation.walls
+
+def init():
+    global frame
+    frame = min(max(startFrame, 0), len(trajectory) - 1)
+
+def step():
+    """Move to the next recorded frame"""
+    global frame
+    # pick up frames a running writer has flushed since the last look
+    if frame + stride >= len(trajectory):
+        trajectory.refresh()
+    frame = min(max(frame + stride, 0), len(trajectory) - 1)
+
+def draw():
+    global renderer
+    import pycxsimulator
+    if renderer is None:
+        renderer = pycxsimulator.BlitRenderer(trajectory.boardDimension)
+    ids, pos, vel = trajectory.frame(frame)
+    title = 't = %d (frame %d/%d)' % (trajectory.step(frame), frame, len(trajectory) - 1)
+    static = [(walls, 'ro')] if walls is not None else None
+    renderer.draw(pos[:, 0], pos[:, 1], title, static=static)
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python replay.py TRAJECTORY [FLOORPLAN]")
+    try:
+        load(*sys.argv[1:])
+    except IOError as e:
+        sys.exit(str(e))
+    if not len(trajectory):
+        sys.exit("%s holds no frames" % sys.argv[1])
+    import matplotlib
+    matplotlib.use("qt4agg")
+    import pycxsimulator
+    pycxsimulator.GUI(parameterSetters=[startFrameF, strideF]).start(func=[init,draw,step])
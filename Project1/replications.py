@@ -0,0 +1,117 @@
+"""Monte Carlo replications of the evacuation model.
+
+Independent evacuation runs, one seed each, are spread over a process
+pool. Each replication records its time-to-empty and how many agents left
+through every exit on every step. The per-scenario summary (time-to-empty
+percentiles and mean cumulative throughput per exit) is written to one
+JSON file.
+
+    python replications.py --scenarios 1 2 --reps 200 --workers 8 --out evacuation_mc.json
+"""
+import argparse
+import json
+import multiprocessing
+import time as clock
+
+import numpy as NP
+
+import headless
+
+percentiles = [5, 25, 50, 75, 95]
+
+def replicate(job):
+    """Run one evacuation to completion (or maxSteps) and return its record"""
+    scenario, seed, maxSteps, params = job
+    model = headless.loadModel('evacuation')
+    config = dict(params)
+    config['scenario'] = scenario
+    headless.configure(model, config)
+    headless.seedModel(seed)
+    started = clock.perf_counter()
+    model.init()
+    population = len(model.flock)
+    flow = []
+    while model.time < maxSteps and not model.finished():
+        model.step()
+        flow.append(model.escaped.tolist())
+    return {
+        'scenario': scenario,
+        'seed': seed,
+        'population': population,
+        'timeToEmpty': model.time if model.finished() else None,
+        'remaining': len(model.flock),
+        'flow': flow,
+        'exits': len(model.exits),
+        'wallSeconds': clock.perf_counter() - started,
+    }
+
+def summarize(records, maxSteps):
+    """Aggregate replication records of one scenario"""
+    done = NP.array([r['timeToEmpty'] for r in records if r['timeToEmpty'] is not None], dtype=float)
+    exits = records[0]['exits']
+    # cumulative evacuated per exit, held at its final value after a run ends
+    curves = NP.zeros((len(records), maxSteps, exits))
+    for k, r in enumerate(records):
+        if r['flow']:
+            cumulative = NP.cumsum(NP.array(r['flow'], dtype=float).reshape(-1, exits), axis=0)
+            curves[k, :len(cumulative)] = cumulative
+            curves[k, len(cumulative):] = cumulative[-1]
+    last = int(done.max()) if len(done) else maxSteps
+    summary = {
+        'replications': len(records),
+        'completed': len(done),
+        'population': records[0]['population'],
+        'timeToEmpty': {
+            'mean': float(done.mean()) if len(done) else None,
+            'std': float(done.std(ddof=1)) if len(done) > 1 else None,
+            'min': float(done.min()) if len(done) else None,
+            'max': float(done.max()) if len(done) else None,
+            'percentiles': dict(('p%d' % p, float(v)) for p, v in
+                                zip(percentiles, NP.percentile(done, percentiles))) if len(done) else {},
+        },
+        # mean cumulative number of agents out through each exit, per step
+        'throughput': [[round(v, 3) for v in curve] for curve in curves[:, :last].mean(axis=0).T.tolist()],
+        'meanWallSeconds': float(NP.mean([r['wallSeconds'] for r in records])),
+    }
+    return summary
+
+def runReplications(scenarios, reps, maxSteps, params=None, workers=None, baseSeed=0):
+    """Run reps seeded replications of every scenario and return the summary"""
+    params = params or {}
+    jobs = [(scenario, baseSeed + k, maxSteps, params) for scenario in scenarios for k in range(reps)]
+    pool = multiprocessing.Pool(workers)
+    try:
+        # one replication per task keeps long and short runs balanced across workers
+        records = pool.map(replicate, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    summary = {'maxSteps': maxSteps, 'params': params, 'baseSeed': baseSeed, 'scenarios': {}}
+    for scenario in scenarios:
+        mine = [r for r in records if r['scenario'] == scenario]
+        summary['scenarios'][str(scenario)] = summarize(mine, maxSteps)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo replications of the evacuation model")
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--reps', type=int, default=100, help='replications per scenario')
+    parser.add_argument('--max-steps', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first replication')
+    parser.add_argument('--set', nargs='*', default=[], type=headless.parseSetting, metavar='NAME=VALUE',
+                        help='evacuation parameters, e.g. populationSize=200')
+    parser.add_argument('--out', default='evacuation_mc.json')
+    args = parser.parse_args()
+
+    params = dict(args.set)
+
+    summary = runReplications(args.scenarios, args.reps, args.max_steps, params, args.workers, args.seed)
+    with open(args.out, 'w') as f:
+        json.dump(summary, f, separators=(',', ':'))
+    for scenario, s in sorted(summary['scenarios'].items()):
+        print("scenario %s: %d/%d emptied, median %s steps" % (
+            scenario, s['completed'], s['replications'], s['timeToEmpty']['percentiles'].get('p50')))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""Parameter sweeps over the steering strengths of the crowd models.
+
+A design (a full grid or a Latin hypercube) of values for the module-level
+strengths is run for a number of seeds each, across a process pool. Every
+finished run is cached as one JSON file named after a hash of the model,
+parameters, seed and step budget, so rerunning an interrupted sweep, adding
+seeds or refining the grid only computes the runs not in the cache.
+
+    python sweep.py evacuation --grid 3 --seeds 5 --out sweep.json
+    python sweep.py evacuation --lhs 40 --range goalStrength=0.5:2 totalStrength=0.05:0.3
+    python sweep.py boids --grid 4 --vary alignStrength approachStrength --steps 500
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import traceback
+
+import numpy as NP
+
+import headless
+
+strengths = ['avoidanceStrength', 'approachStrength', 'alignStrength',
+             'obstacleStrength', 'goalStrength', 'totalStrength']
+# boids has no walls or exits
+modelStrengths = {'boids': strengths[:3] + strengths[5:], 'evacuation': strengths}
+defaultRange = (0.0, 1.0)
+
+def gridDesign(ranges, levels):
+    """Every combination of `levels` evenly spaced values per parameter"""
+    names = sorted(ranges)
+    axes = [NP.linspace(ranges[name][0], ranges[name][1], levels) for name in names]
+    return [dict(zip(names, map(float, values))) for values in itertools.product(*axes)]
+
+def latinHypercube(ranges, samples, seed=0):
+    """`samples` points with each parameter's range cut into `samples` strata, one point per stratum"""
+    rng = NP.random.RandomState(seed)
+    names = sorted(ranges)
+    points = [{} for k in range(samples)]
+    for name in names:
+        low, high = ranges[name]
+        u = (rng.permutation(samples) + rng.uniform(size=samples)) / samples
+        for point, value in zip(points, low + u * (high - low)):
+            point[name] = float(value)
+    return points
+
+def cacheKey(modelName, params, seed, steps):
+    """Stable hash of everything that determines the outcome of a run"""
+    spec = json.dumps([modelName, params, seed, steps], sort_keys=True)
+    return hashlib.sha1(spec.encode('utf-8')).hexdigest()
+
+def evaluate(job):
+    """Run one (parameters, seed) point; executed in a worker process"""
+    modelName, params, seed, steps = job
+    model = headless.loadModel(modelName)
+    summary = headless.run(model, steps, params, seed)
+    if hasattr(model, 'congestion'):
+        summary['exitCounts'] = model.congestion()['exitCounts'].tolist()
+    summary['timeToEmpty'] = summary['steps'] if summary['finished'] else None
+    return summary
+
+class ResultCache:
+    """One JSON file per finished run in `directory`, keyed by cacheKey()"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def put(self, key, record):
+        # write then rename, so an interrupted sweep never leaves half a file
+        tmp = self.path(key) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp, self.path(key))
+
+def runSweep(modelName, design, seeds, steps, fixed=None, workers=None, cache=None, progress=None):
+    """Run every design point for every seed and return one record per run.
+
+    fixed holds parameters set on every run (e.g. populationSize). Runs
+    found in cache are not recomputed; new ones are stored as they finish.
+    A run that raises is returned as a record with failed=True and the
+    error, and is not cached, so the rest of the sweep carries on.
+    progress, if given, is called with (done, total) after each new run.
+    """
+    fixed = fixed or {}
+    records, jobs, keys = [], [], []
+    for point in design:
+        params = dict(fixed)
+        params.update(point)
+        for seed in seeds:
+            key = cacheKey(modelName, params, seed, steps)
+            record = cache.get(key) if cache is not None else None
+            if record is not None:
+                records.append(record)
+            else:
+                jobs.append((modelName, params, seed, steps))
+                keys.append(key)
+    if jobs:
+        pool = multiprocessing.Pool(workers)
+        try:
+            # results are cached as they arrive, in whatever order they finish
+            for done, (k, record) in enumerate(pool.imap_unordered(_evaluateNumbered, list(enumerate(jobs))), 1):
+                if cache is not None and not record.get('failed'):
+                    cache.put(keys[k], record)
+                records.append(record)
+                if progress:
+                    progress(done, len(jobs))
+        finally:
+            pool.close()
+            pool.join()
+    return records
+
+def _evaluateNumbered(numberedJob):
+    k, job = numberedJob
+    try:
+        return k, evaluate(job)
+    except Exception as e:
+        modelName, params, seed, steps = job
+        return k, {'model': modelName, 'seed': seed, 'params': params, 'steps': steps, 'failed': True,
+                   'error': '%s: %s' % (type(e).__name__, e), 'traceback': traceback.format_exc()}
+
+def summarize(records, names):
+    """Mean outcome of each parameter set over the seeds that ran, best first"""
+    groups = {}
+    for r in records:
+        point = tuple(r['params'][name] for name in names)
+        groups.setdefault(point, []).append(r)
+    rows = []
+    for point, runs in groups.items():
+        ok = [r for r in runs if not r.get('failed')]
+        done = [r['timeToEmpty'] for r in ok if r['timeToEmpty'] is not None]
+        rows.append({
+            'params': dict(zip(names, point)),
+            'seeds': len(runs),
+            'failed': len(runs) - len(ok),
+            'completed': len(done),
+            'meanTimeToEmpty': float(NP.mean(done)) if done else None,
+            'meanRemaining': float(NP.mean([r['agents'] for r in ok])) if ok else None,
+            'meanStepsPerSecond': float(NP.mean([r['stepsPerSecond'] for r in ok])) if ok else None,
+        })
+    # most runs emptied first, then fastest to empty
+    rows.sort(key=lambda row: (-row['completed'], row['meanTimeToEmpty'] or 0,
+                               NP.inf if row['meanRemaining'] is None else row['meanRemaining']))
+    return rows
+
+def parseRange(text):
+    """NAME=LOW:HIGH"""
+    name, sep, bounds = text.partition('=')
+    low, colon, high = bounds.partition(':')
+    if not sep or not colon:
+        raise argparse.ArgumentTypeError("expected NAME=LOW:HIGH, got %r" % text)
+    return name, (float(low), float(high))
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the steering strengths of a crowd model")
+    parser.add_argument('model', choices=headless.models)
+    design = parser.add_mutually_exclusive_group(required=True)
+    design.add_argument('--grid', type=int, metavar='LEVELS', help='full grid with LEVELS values per parameter')
+    design.add_argument('--lhs', type=int, metavar='SAMPLES', help='Latin hypercube with SAMPLES points')
+    parser.add_argument('--vary', nargs='+', default=None, metavar='NAME',
+                        help='parameters to sweep (default: every strength the model has)')
+    parser.add_argument('--range', nargs='*', default=[], type=parseRange, metavar='NAME=LOW:HIGH',
+                        help='range of a swept parameter (default %g:%g)' % defaultRange)
+    parser.add_argument('--seeds', type=int, default=3, help='seeds per design point')
+    parser.add_argument('--seed', type=int, default=0, help='first seed; also seeds the Latin hypercube')
+    parser.add_argument('--steps', type=int, default=2000, help='maximum steps per run')
+    parser.add_argument('--set', nargs='*', default=[], type=headless.parseSetting, metavar='NAME=VALUE',
+                        help='parameters fixed for every run, e.g. populationSize=200 scenario=2')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    parser.add_argument('--cache', default='sweep_cache', help='directory of cached runs')
+    parser.add_argument('--out', default='sweep.json')
+    args = parser.parse_args()
+
+    names = args.vary or modelStrengths[args.model]
+    ranges = dict((name, defaultRange) for name in names)
+    for name, bounds in args.range:
+        if name not in ranges:
+            parser.error("--range given for %s, which is not swept" % name)
+        ranges[name] = bounds
+    fixed = dict(args.set)
+
+    if args.grid:
+        points = gridDesign(ranges, args.grid)
+    else:
+        points = latinHypercube(ranges, args.lhs, args.seed)
+    seeds = list(range(args.seed, args.seed + args.seeds))
+
+    def progress(done, total):
+        print("%d/%d new runs" % (done, total))
+    records = runSweep(args.model, points, seeds, args.steps, fixed, args.workers,
+                       ResultCache(args.cache), progress)
+    failed = [r for r in records if r.get('failed')]
+    for r in failed:
+        print("failed: seed %s %s: %s" % (r['seed'], json.dumps(r['params'], sort_keys=True), r['error']))
+    rows = summarize(records, sorted(names))
+    with open(args.out, 'w') as f:
+        json.dump({'model': args.model, 'fixed': fixed, 'ranges': ranges, 'seeds': seeds,
+                   'steps': args.steps, 'points': rows, 'runs': records}, f, separators=(',', ':'))
+    for row in rows[:5]:
+        print("%d/%d emptied, mean %s steps: %s" % (
+            row['completed'], row['seeds'], row['meanTimeToEmpty'], json.dumps(row['params'], sort_keys=True)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Compact binary trajectories of crowd runs, for replay without recomputing.
+
+A trajectory file is a 64-byte header, the path of the floor plan an
+evacuation run used (UTF-8, empty for the built-in scenarios), then one
+frame per recorded step. A frame is a float32 array of shape
+(population, 4) holding x, y, vx, vy for every agent of the initial
+population, indexed by Flock.ids, so an agent keeps its row for the
+whole run. Agents that have left (the evacuation model removes them) are
+NaN. Frames are only ever appended; the reader maps the file with
+NP.memmap and slices frames out of it, so opening a long run or jumping
+to its last step reads only what is used.
+
+    python headless.py evacuation --trajectory run.trj --trajectory-every 2
+    python replay.py run.trj
+"""
+import os
+import struct
+
+import numpy as NP
+
+magic = b'CRWDTRJ1'
+version = 2
+# magic, version, population, steps, scenario, every, boardDimension, model,
+# length of the floor plan path
+headerFormat = '<8sIIIiIf16sI'
+headerSize = 64
+
+class TrajectoryWriter:
+    """Appends a frame of a model's flock to `path` every `every` steps.
+
+    population is the number of agents at the start of the run, floorPlan
+    the plan file of an evacuation run that did not use a built-in
+    scenario. The step count in the header is rewritten every syncEvery
+    frames and on close(), so a file that is still being written can
+    already be replayed.
+    """
+
+    def __init__(self, path, population, scenario=0, model='', boardDimension=0, every=1, syncEvery=64,
+                 floorPlan=None):
+        self.path = path
+        self.population = population
+        self.scenario = scenario
+        self.model = model
+        self.boardDimension = boardDimension
+        self.every = every
+        self.floorPlan = (floorPlan or '').encode('utf-8')
+        self.syncEvery = syncEvery
+        self.steps = 0
+        self.frame = NP.empty((population, 4), dtype=NP.float32)
+        self.file = open(path, 'wb')
+        self.writeHeader()
+
+    @classmethod
+    def forModel(cls, path, model, every=1):
+        """A writer sized for the model's current flock"""
+        return cls(path, len(model.flock), getattr(model, 'scenario', 0), model.__name__,
+                   model.boardDimension, every, floorPlan=getattr(model, 'floorPlan', None))
+
+    def writeHeader(self):
+        header = struct.pack(headerFormat, magic, version, self.population, self.steps,
+                             self.scenario, self.every, self.boardDimension,
+                             self.model.encode('ascii')[:16], len(self.floorPlan))
+        self.file.seek(0)
+        self.file.write(header.ljust(headerSize, b'\0') + self.floorPlan)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, flock):
+        """Write the flock's positions and velocities as the next frame"""
+        frame = self.frame
+        frame.fill(NP.nan)
+        frame[flock.ids, :2] = flock.pos
+        frame[flock.ids, 2:] = flock.oldVel
+        self.file.write(frame.data)
+        self.steps += 1
+        if self.steps % self.syncEvery == 0:
+            self.flush()
+
+    def capture(self, model):
+        """append(model.flock) if this step is due"""
+        if model.time % self.every == 0:
+            self.append(model.flock)
+
+    def flush(self):
+        self.writeHeader()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class TrajectoryReader:
+    """Memory-mapped view of a trajectory file.
+
+    frames is a read-only (steps, population, 4) float32 array; frame(k)
+    returns the ids, positions and velocities of the agents present in
+    frame k. The frame count comes from the file size, so the frames a
+    live writer has flushed are visible after refresh().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(headerSize)
+            if len(header) < headerSize or header[:8] != magic:
+                raise ValueError("%s is not a trajectory file" % path)
+            (_, fileVersion, self.population, self.recorded, self.scenario, self.every,
+             self.boardDimension, model, planLength) = struct.unpack(headerFormat, header[:struct.calcsize(headerFormat)])
+            if fileVersion != version:
+                raise ValueError("%s has trajectory format version %d, expected %d" % (path, fileVersion, version))
+            self.floorPlan = f.read(planLength).decode('utf-8') or None
+        self.model = model.rstrip(b'\0').decode('ascii')
+        # frames start after the floor plan path
+        self.offset = headerSize + planLength
+        self.refresh()
+
+    def refresh(self):
+        """Map every complete frame currently in the file"""
+        frameBytes = self.population * 4 * 4
+        size = os.path.getsize(self.path) - self.offset
+        steps = size // frameBytes if frameBytes else 0
+        if steps:
+            self.frames = NP.memmap(self.path, dtype=NP.float32, mode='r', offset=self.offset,
+                                    shape=(steps, self.population, 4))
+        else:
+            self.frames = NP.zeros((0, self.population, 4), dtype=NP.float32)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def step(self, k):
+        """Model step at which frame k was taken"""
+        return k * self.every
+
+    def frame(self, k):
+        """ids, positions (n, 2) and velocities (n, 2) of the agents in frame k"""
+        data = self.frames[k]
+        ids = NP.nonzero(~NP.isnan(data[:, 0]))[0]
+        data = data[ids]
+        return ids, data[:, :2], data[:, 2:]
+
+    def track(self, agent):
+        """Positions of one agent over the whole run, (steps, 2), NaN once it left"""
+        return self.frames[:, agent, :2]
@@ -1,20 +1,29 @@
+from heapq import heappush, heappop
 
 class PriorQ(object):
+    """Binary heap of (timestamp, id, ...) events.
+
+    The ids increase with every scheduled event, so events at the same time
+    come out in the order they were inserted, as with the linear scan this
+    replaces. push/pop/len are the future event list interface of
+    Event_Oriented_Jas/fel.py, whose calendar and ladder queues can stand in
+    for it.
+    """
 
     def __init__(self):
         self.items = []
 
+    def __len__(self):
+        return len(self.items)
+
     def is_empty(self):
-        return self.items == []
+        return not self.items
 
     def insert(self, item):
-        self.items.append(item)
+        heappush(self.items, item)
 
     def remove(self):
-        mini = 0
-        for i in range(1, len(self.items)):
-            if self.items[i][0] < self.items[mini][0]:
-                mini = i
-        item = self.items[mini]
-        self.items.pop(mini)
-        return item
+        return heappop(self.items)
+
+    push = insert
+    pop = remove
@@ -0,0 +1,248 @@
+"""Future event list (FEL) implementations for the corridor simulations.
+
+Every FEL holds event tuples whose first element is the timestamp and
+whose second is a unique sequence number, as built by
+simulationengine.Simulation.schedule, and offers the same small interface:
+
+    fel.push(event)     schedule an event
+    fel.pop()           remove and return the earliest event
+    len(fel)            number of pending events
+
+HeapFEL is a binary heap (heapq); CalendarQueue is Brown's calendar queue
+with automatic bucket-width resizing; LadderQueue is the ladder queue of
+Tang, Goh and Thng. The last two have O(1) expected cost per operation,
+which pays off with millions of pending events. Pick one by name with
+make_fel(); felbench.py compares them with the hold model.
+"""
+from __future__ import division
+from bisect import insort
+from functools import partial
+from heapq import heappush, heappop, heapify, nsmallest
+import itertools
+
+
+class HeapFEL:
+    """Binary heap; push and pop are heapq's C functions bound to the list"""
+
+    def __init__(self):
+        self.items = []
+        self.push = partial(heappush, self.items)
+        self.pop = partial(heappop, self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CalendarQueue:
+    """Calendar queue (R. Brown, CACM 1988).
+
+    Events are hashed by time into a ring of buckets ("days") of equal width,
+    each a sorted list; the ring covers one "year". pop() walks the ring from
+    the current day and takes the first event that falls within it. When the
+    number of events passes twice, or drops below half, the number of
+    buckets, the calendar is rebuilt with double or half as many, and the
+    width is re-estimated as three times the mean gap between the earliest
+    events, so there are a few events per day whatever the time scale.
+    """
+
+    min_buckets = 2
+    samples = 25
+
+    def __init__(self, width=1.0):
+        self.size = 0
+        self.last_time = 0.0
+        self._build(self.min_buckets, width, [])
+
+    def __len__(self):
+        return self.size
+
+    def _build(self, nbuckets, width, items):
+        self.nbuckets = nbuckets
+        self.width = width
+        self.buckets = [[] for i in range(nbuckets)]
+        for item in items:
+            insort(self.buckets[int(item[0] / width) % nbuckets], item)
+        day = int(self.last_time / width)
+        self.current = day % nbuckets
+        self.bucket_top = (day + 1) * width
+        self.grow_at = 2 * nbuckets
+        self.shrink_at = nbuckets // 2 - 2
+
+    def _resize(self, nbuckets):
+        items = [item for bucket in self.buckets for item in bucket]
+        self._build(nbuckets, self._new_width(items), items)
+
+    def _new_width(self, items):
+        """Three times the mean separation of the earliest events, ignoring outliers"""
+        n = min(len(items), self.samples)
+        if n < 2:
+            return self.width
+        times = [item[0] for item in nsmallest(n, items)]
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        mean = sum(gaps) / len(gaps)
+        usual = [g for g in gaps if g <= 2 * mean]
+        if usual:
+            mean = sum(usual) / len(usual)
+        return 3 * mean if mean > 0 else self.width
+
+    def push(self, item):
+        insort(self.buckets[int(item[0] / self.width) % self.nbuckets], item)
+        self.size += 1
+        if self.size > self.grow_at:
+            self._resize(2 * self.nbuckets)
+
+    def pop(self):
+        if not self.size:
+            raise IndexError("pop from an empty calendar queue")
+        buckets = self.buckets
+        i = self.current
+        top = self.bucket_top
+        n = self.nbuckets
+        for k in itertools.repeat(None, n):
+            bucket = buckets[i]
+            if bucket and bucket[0][0] < top:
+                return self._take(i, top)
+            i += 1
+            if i == n:
+                i = 0
+            top += self.width
+        # nothing within a year of the current day: jump to the earliest event
+        i = min((b[0][0], n) for n, b in enumerate(buckets) if b)[1]
+        return self._take(i, (int(buckets[i][0][0] / self.width) + 1) * self.width)
+
+    def _take(self, i, top):
+        item = self.buckets[i].pop(0)
+        self.current = i
+        self.bucket_top = top
+        self.last_time = item[0]
+        self.size -= 1
+        if self.size < self.shrink_at and self.nbuckets > self.min_buckets:
+            self._resize(self.nbuckets // 2)
+        return item
+
+
+class _Rung:
+    """One rung of a ladder queue: equal-width buckets from `start`"""
+
+    def __init__(self, start, width, nbuckets):
+        self.start = start
+        self.width = width
+        self.buckets = [[] for i in range(nbuckets)]
+        self.current = 0  # first bucket not yet handed down
+
+    def current_start(self):
+        return self.start + self.current * self.width
+
+    def add(self, item):
+        i = int((item[0] - self.start) / self.width)
+        # guard against rounding at the edges of the rung
+        i = min(max(i, self.current), len(self.buckets) - 1)
+        self.buckets[i].append(item)
+
+
+class LadderQueue:
+    """Ladder queue (W. T. Tang, R. S. M. Goh, I. L.-J. Thng, TOMACS 2005).
+
+    Far-future events go unsorted into Top. When the rest runs dry, Top is
+    spread over the buckets of a first rung; the earliest non-empty bucket
+    is either split into a finer rung below (if it holds more than
+    `threshold` events) or moved into Bottom, a small heap that pop() serves
+    from. Events scheduled into the near future go straight to the rung or
+    Bottom covering their time. Each event is moved a bounded number of
+    times, so push and pop are O(1) amortized.
+    """
+
+    threshold = 50
+    max_rungs = 8
+
+    def __init__(self):
+        self.top = []
+        self.top_min = float('inf')
+        self.top_max = -self.top_min
+        self.top_start = -self.top_min
+        self.rungs = []
+        self.bottom = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, item):
+        t = item[0]
+        self.size += 1
+        if t >= self.top_start:
+            self.top.append(item)
+            if t < self.top_min:
+                self.top_min = t
+            if t > self.top_max:
+                self.top_max = t
+            return
+        for rung in self.rungs:
+            if t >= rung.current_start():
+                rung.add(item)
+                return
+        heappush(self.bottom, item)
+
+    def pop(self):
+        if not self.bottom:
+            self._refill()
+        self.size -= 1
+        return heappop(self.bottom)
+
+    def _refill(self):
+        """Move the earliest events into Bottom"""
+        while True:
+            if not self.rungs:
+                if not self.top:
+                    raise IndexError("pop from an empty ladder queue")
+                self._top_to_rung()
+                if self.bottom:
+                    return
+                continue
+            rung = self.rungs[-1]
+            while rung.current < len(rung.buckets) and not rung.buckets[rung.current]:
+                rung.current += 1
+            if rung.current == len(rung.buckets):
+                self.rungs.pop()
+                continue
+            bucket = rung.buckets[rung.current]
+            rung.buckets[rung.current] = []
+            start = rung.current_start()
+            rung.current += 1
+            if len(bucket) > self.threshold and len(self.rungs) < self.max_rungs and rung.width > 0:
+                # too many to sort at once: spread them over a finer rung
+                child = _Rung(start, rung.width / self.threshold, self.threshold)
+                for item in bucket:
+                    child.add(item)
+                self.rungs.append(child)
+                continue
+            heapify(bucket)
+            self.bottom = bucket
+            return
+
+    def _top_to_rung(self):
+        top = self.top
+        width = (self.top_max - self.top_min) / len(top)
+        if width == 0:
+            # all at the same time: they can go to Bottom as they are
+            heapify(top)
+            self.bottom = top
+        else:
+            rung = _Rung(self.top_min, width, len(top) + 1)
+            for item in top:
+                rung.add(item)
+            self.rungs.append(rung)
+        # later pushes past the first rung's end go to Top again
+        self.top_start = self.top_min + width * (len(top) + 1)
+        self.top = []
+        self.top_min = float('inf')
+        self.top_max = -self.top_min
+
+
+backends = {'heap': HeapFEL, 'calendar': CalendarQueue, 'ladder': LadderQueue}
+
+def make_fel(name='heap'):
+    """A new, empty future event list of the named kind"""
+    if name not in backends:
+        raise ValueError("unknown FEL {0!r}, expected one of {1}".format(name, sorted(backends)))
+    return backends[name]()
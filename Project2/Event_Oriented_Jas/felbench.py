@@ -0,0 +1,84 @@
+"""Hold-model benchmark of the future event lists in fel.py.
+
+The hold model fills a FEL with n events, then repeats "hold" operations:
+pop the earliest event and schedule a new one at its time plus a random
+increment, so the size stays at n. The cost per hold depends on the size
+and on the increment distribution, which is why several are tried:
+
+    exponential   memoryless arrivals, the textbook case
+    uniform       increments in [0, 2)
+    bimodal       mostly short delays with a few far-future events, which
+                  upsets calendar queues that size their days on the former
+    corridor      the mix of the corridor model: interarrival times, red
+                  light waits, intersection crossings and section traversals
+
+Finally the corridor simulation itself is run once with each FEL.
+
+usage: python felbench.py [max size (default 1000000)] [holds per size (default 200000)]
+"""
+from __future__ import print_function
+import itertools
+import random
+import sys
+import time
+
+from fel import backends, make_fel
+import simulationengine as engine
+
+def corridor_increment(rng):
+    kind = rng.random()
+    if kind < 0.25:
+        return rng.expovariate(1 / engine.A)
+    if kind < 0.5:
+        g, y, r = engine.signal_time_NB[rng.choice([10, 11, 12, 14])]
+        return rng.uniform(0, r) + rng.choice([0, engine.intersection_x_times[10] / 2])
+    if kind < 0.75:
+        return engine.intersection_x_times[rng.choice(engine.intersections)]
+    return rng.choice(list(engine.section_traverse_times.values()))
+
+distributions = {
+    'exponential': lambda rng: rng.expovariate(1.0),
+    'uniform': lambda rng: rng.uniform(0, 2),
+    'bimodal': lambda rng: rng.expovariate(10.0) if rng.random() < 0.9 else rng.uniform(100, 200),
+    'corridor': corridor_increment,
+}
+
+def hold(name, size, holds, increment, seed=1):
+    """Seconds per hold operation on a FEL of the given size"""
+    rng = random.Random(seed)
+    seq = itertools.count()
+    fel = make_fel(name)
+    for i in range(size):
+        fel.push((increment(rng), next(seq)))
+    # warm up, so the queue reaches its steady state before timing
+    pop, push = fel.pop, fel.push
+    for i in range(min(size, holds)):
+        t = pop()[0]
+        push((t + increment(rng), next(seq)))
+    start = time.time()
+    for i in range(holds):
+        t = pop()[0]
+        push((t + increment(rng), next(seq)))
+    return (time.time() - start) / holds
+
+def main():
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    holds = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    sizes = [n for n in (100, 1000, 10000, 100000, 1000000, 10000000) if n <= top]
+    names = sorted(backends)
+    print("hold model, microseconds per hold")
+    print("{0:12} {1:>9}".format("increments", "size") + "".join("{0:>10}".format(n) for n in names))
+    for dist in sorted(distributions):
+        for size in sizes:
+            cost = [hold(name, size, holds, distributions[dist]) for name in names]
+            print("{0:12} {1:>9}".format(dist, size) + "".join("{0:>10.2f}".format(c * 1e6) for c in cost))
+    print("corridor simulation, {0} cars, events per second".format(engine.Cutoff * 100))
+    for name in names:
+        sim = engine.Simulation(engine.A, engine.Cutoff * 100, filename="/dev/null", seed=1, fel=name)
+        start = time.time()
+        sim.run()
+        elapsed = time.time() - start
+        print("{0:10} {1:>10.0f}   average travel {2:.3f}".format(name, sim.events / elapsed, sim.average_travel()))
+
+if __name__ == "__main__":
+    main()
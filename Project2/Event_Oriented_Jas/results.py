@@ -0,0 +1,117 @@
+"""Buffered per-vehicle results for the corridor simulations.
+
+A ResultSink collects one record per vehicle that leaves the corridor:
+its id, travel time, start and end time and the time it waited at each
+intersection of the route. Records go into typed arrays, one per column,
+and are written out a block at a time, so a run makes a handful of writes
+instead of opening the output file for every vehicle.
+
+Two formats:
+
+    csv        a header row, then one row per vehicle; the first two
+               columns are vehicle and travel time, as in the old output
+    columnar   binary: a header naming the columns and their typecodes,
+               then blocks of a record count followed by each column's
+               values. read_results() loads it back into arrays.
+"""
+from array import array
+import csv
+import struct
+import sys
+
+MAGIC = b"CRDRES1\n"
+_count = struct.Struct("<I")
+
+def _open_csv(path):
+    if sys.version_info[0] < 3:
+        return open(path, "wb")
+    return open(path, "w", newline="")
+
+class ResultSink(object):
+    """Per-vehicle records for the intersections in `route`, written every `block` vehicles.
+
+    `format` is 'csv' or 'columnar'; by default a path ending in .crd is
+    columnar and anything else CSV. The file is created (or truncated)
+    when the sink is; close() writes what is left. Use it as a context
+    manager to close it even if the run fails.
+    """
+
+    def __init__(self, path, route, format=None, block=65536):
+        if format is None:
+            format = "columnar" if path.endswith(".crd") else "csv"
+        if format not in ("csv", "columnar"):
+            raise ValueError("unknown result format {0!r}".format(format))
+        self.path = path
+        self.format = format
+        self.block = block
+        self.columns = ["vehicle", "travel", "start", "end"] + ["wait_{0}".format(i) for i in route]
+        self.typecodes = ["i"] + ["d"] * (len(self.columns) - 1)
+        self.buffers = [array(code) for code in self.typecodes]
+        self.count = 0  # records written so far
+        if format == "csv":
+            self.file = _open_csv(path)
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.columns)
+        else:
+            self.file = open(path, "wb")
+            header = " ".join("{0}:{1}".format(name, code) for name, code in zip(self.columns, self.typecodes))
+            self.file.write(MAGIC + "{0} {1}\n".format(sys.byteorder, header).encode("ascii"))
+
+    def record(self, vehicle, start, end, waits):
+        """Add one vehicle; waits holds the wait at each intersection of the route"""
+        buffers = self.buffers
+        buffers[0].append(vehicle)
+        buffers[1].append(end - start)
+        buffers[2].append(start)
+        buffers[3].append(end)
+        for buf, wait in zip(buffers[4:], waits):
+            buf.append(wait)
+        if len(buffers[0]) >= self.block:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records and empty the buffers"""
+        n = len(self.buffers[0])
+        if not n:
+            return
+        if self.format == "csv":
+            self.writer.writerows(zip(*self.buffers))
+        else:
+            self.file.write(_count.pack(n))
+            for buf in self.buffers:
+                buf.tofile(self.file)
+        self.file.flush()
+        self.count += n
+        self.buffers = [array(code) for code in self.typecodes]
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_results(path):
+    """Columns of a columnar result file, as a dict of name to array"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{0} is not a columnar result file".format(path))
+        fields = f.readline().decode("ascii").split()
+        byteorder, fields = fields[0], [field.split(":") for field in fields[1:]]
+        columns = [(name, array(code)) for name, code in fields]
+        while True:
+            head = f.read(_count.size)
+            if len(head) < _count.size:
+                break
+            n = _count.unpack(head)[0]
+            for name, values in columns:
+                values.fromfile(f, n)
+    if byteorder != sys.byteorder:
+        for name, values in columns:
+            values.byteswap()
+    return dict(columns)
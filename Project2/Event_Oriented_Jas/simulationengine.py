@@ -1,9 +1,13 @@
-from heapq import *
+from __future__ import print_function
+from fel import make_fel, backends
+from results import ResultSink
+from stats import Summary, TimeWeighted
 # from traffic import *
 import random
 import math
 import time
-import csv
+import itertools
+import argparse
 
 debug = False #flag to debug
 #northbound signal timings
@@ -25,241 +29,237 @@ section_traverse_times = {(10,11): 15.45,
                       (11,12):14.42,
                       (12,14):24.42}
 
-class Event:
-    def __init__(self, timestamp, data):
-        self.timestamp = timestamp
-        self.id = data['vehicle_id']
-        self.type = data['type']
-        self.to_cross = data['next'] #intersection that needs to be crossed next (starts of as 10th)
-        self.start = data['start']
-        self.data = data
-        self.latest = timestamp
+intersections = [10, 11, 12, 13, 14]
+# intersections a vehicle passes, in order (13 has no signal and is skipped)
+route = [10, 11, 12, 14]
+route_index = dict((inter, k) for k, inter in enumerate(route))
 
+# Type of events, stored as small integers in the event tuples
+ARRIVAL, CROSS, DEPARTURE = 0, 1, 2
+event_names = ["arrival", "cross", "departure"]
 
+# An event is a plain tuple
+#   (timestamp, seq, type, vehicle_id, to_cross, start)
+# to_cross is the intersection to be crossed next (starts off as 10th), start is
+# when the vehicle entered the corridor. seq increases with every scheduled
+# event, so events at the same time are handled in the order they were
+# scheduled and the tuples never compare beyond it.
 
-#State variables  and other global information
 
 # Simulation constants; all times in seconds
 # A = mean interarrival time (in seconds, between cars)
 
 
 A = 12.0
-filename = "{0} OutputData.csv".format(int(A))
 
 Cutoff = 1000 #number of cars to simulate
-#State Variables of Simulation
-waiting_counts = {10:0, 11:0, 12:0, 13:0, 14:0} #pre_X
-waiting_time = {10:0, 11:0, 12:0, 13:0, 14:0}
-# pre_X = 0	            # cars waiting to use intersection
 
-#Eventually, there will be a variable per lane per intersection
-ArrivalCount=0	        #number of arrivals simulated; used for termination
-
-# State variables used for statistics
-
-LastEventTime = 0 # time of last event processed
-TotalTravel = 0
-
-
-# Interval between arrivals averaging mean seconds (5)
-#R.N.G. for providing vehicle arrivals based on exponential distrbution
-def random_exp(mean):
-    return random.expovariate(1/mean)
-# Type of events: arrival, through, departure
-
-
-arrivalCounts = {10:0, 11:0, 12:0, 13:0, 14:0}
-crossCounts = {10:0, 11:0, 12:0, 13:0, 14:0}
-depCounts = {10:0, 11:0, 12:0, 13:0, 14:0}
-
-now = 0.0  #clock simulator
-
-intersectionFree = True
-
-def schedule(queue, time, event):
-    heappush(queue, (time,event))
-
-
-
-#Event Handlers:
-
-def arrival(event, q): #to some intersection
-    global now
-    global LastEventTime
-    global pre_X
-    global ArrivalCount
-    global intersectionFree
-
-    if debug:
-        print "Arrival Event: time = {0}".format(now)
-        print "Vehicle ID: {0}".format(event.data['vehicle_id'])
-    #if interesection is free, car will enter, else it will wait
-    curr_vehicle = event.id
-    curr_inter = event.to_cross
-    og = event.start
-
-    #if light at 10th street intersection is green, car will enter, else it will wait
-    g,y,r = signal_time_NB[curr_inter] #signal times for 10th st light
-    signal_cycle = g+y+r
-
-
-    arrivalCounts[curr_inter] += 1
-
-    wait =  0
-    if ((now % signal_cycle) > (g+y)): #arrived when red light
-        wait = r - ((now % signal_cycle) - (g+y) )
-        waiting_counts[curr_inter] = waiting_counts[curr_inter] + 1
-
-
-
-    if curr_inter == 10:
-        ArrivalCount = ArrivalCount + 1
-        if ArrivalCount < Cutoff:
-            next_id = curr_vehicle + 1
-            ts = now + random_exp(A)
-            data = {
-                "type" : "arrival",
-                "vehicle_id" : next_id,
-                "next": 10,
-                "start": ts,
-                "latest": ts
-            }
-            new_event = Event(ts, data)
-            schedule(q, ts, new_event)
-
-
-
-    add = 0
-    if waiting_counts[curr_inter] > 1: #if more than one car
-        add = intersection_x_times[curr_inter]/2 #wait till previous car is halfway through intersection
-    next_ts = now + wait + add
-    data = {
-        "type" : "cross",
-        "vehicle_id" : curr_vehicle,
-        "next": curr_inter,
-        "start": og,
-        "latest": next_ts
-    }
-    #still need to cross the same intersection
-    new_event = Event(next_ts, data)
-    schedule(q, next_ts, new_event)
-
-
-
-
-def cross(event, q):
-
-    global LastEventTime
-    global pre_X
-    global now
-
-    if debug:
-        print "Crossing Event: time = {0}".format(now)
-        print "Vehicle ID: {0}".format(event.data['vehicle_id'])
-
-    curr_vehicle = event.id
-    curr_inter = event.to_cross
-    og = event.start
-    crossCounts[curr_inter] += 1
-    if waiting_counts[curr_inter] > 0:
-        waiting_counts[curr_inter] = waiting_counts[curr_inter] - 1
-
-    #Schedule departure event
-
-
-    ts = now + intersection_x_times[curr_inter]
-    data = {
-        "type" : "departure",
-        "vehicle_id" : curr_vehicle,
-        "next": curr_inter,
-        "start": og,
-        "latest": ts
-    }
-    new_event = Event(ts, data)
-    schedule(q, ts, new_event)
-
-
-
-
-
-def departure(event,q):
-    global LastEventTime
-    global now
-    global TotalTravel
-
-    if debug:
-        print "Departure Event: time = {0}".format(now)
-        print "Vehicle ID: {0}".format(event.data['vehicle_id'])
-
-    curr_vehicle = event.id
-    curr_inter = event.to_cross
-    og = event.start
-    depCounts[curr_inter] += 1
-    if curr_inter < 13: #schedule arrival to next intersection
-        next_inter = curr_inter + 1
-        if curr_inter == 12:
-            next_inter = next_inter + 1
-        next_ts = now + section_traverse_times[(curr_inter, next_inter)]
-        data = {
-                "type" : "arrival",
-                "vehicle_id" : curr_vehicle,
-                "next": next_inter,
-                "start" : og,
-                "latest": next_ts
-            }
-        new_event = Event(next_ts, data)
-        schedule(q, next_ts, new_event)
-    else: #end of all scheduling
-
-        vehicle_travel = event.latest - event.start
-        TotalTravel = TotalTravel + vehicle_travel
-        with open(filename, 'a') as f:
-            wr = csv.writer(f)
-            wr.writerow([curr_vehicle,vehicle_travel])
-
-
-def run_sim(q):
-    print "running"
-    while(q):
-        curr = heappop(q)
-        global now
-        now = curr[0]
-        curr_event = curr[1]
-        if curr_event.type == "arrival":
-            arrival(curr_event, q)
-        elif curr_event.type == "cross":
-            cross(curr_event, q)
-        elif curr_event.type == "departure":
-            departure(curr_event,q)
-
-        #call event handler relative to curr_event
+class Simulation:
+    """One run of the corridor model.
+
+    The clock (now), the future event list (queue), the state variables and
+    the statistics all belong to the instance, and arrival/cross/departure
+    are its event handlers, so any number of runs can be made back to back
+    or side by side in one process. Each run draws from its own random
+    generator, seeded with `seed`. `fel` names the future event list
+    implementation (see fel.py): 'heap', 'calendar' or 'ladder'.
+
+    Each vehicle leaving the corridor is recorded in self.results, a
+    results.ResultSink writing to `filename`: CSV, or the binary columnar
+    format if the name ends in .crd; with record=False nothing is written.
+    With stats=True, travel times, waits and queue lengths are also
+    summarized as the run goes, in constant memory (see stats.py and
+    report()); this costs about half the event throughput.
+    """
+
+    def __init__(self, A=A, Cutoff=Cutoff, filename=None, seed=None, fel='heap', record=True, stats=True):
+        self.A = A
+        self.Cutoff = Cutoff
+        self.filename = filename or "{0} OutputData.csv".format(int(A))
+        self.record = record
+        self.stats = stats
+        #R.N.G. for providing vehicle arrivals based on exponential distrbution
+        self.random = random.Random(seed)
+
+        self.now = 0.0  #clock simulator
+        self.queue = make_fel(fel) #priority queue fo FEL
+        self.seq = itertools.count() #tie-breaker for events at the same time
+        self.events = 0 #events processed
+
+        #State Variables of Simulation
+        self.waiting_counts = dict((i, 0) for i in intersections) #pre_X
+        self.waiting_time = dict((i, 0) for i in intersections)
+        self.ArrivalCount = 0 #number of arrivals simulated; used for termination
+
+        # State variables used for statistics
+        self.TotalTravel = 0
+        self.arrivalCounts = dict((i, 0) for i in intersections)
+        self.crossCounts = dict((i, 0) for i in intersections)
+        self.depCounts = dict((i, 0) for i in intersections)
+        self.waits = {} #wait at each route intersection, per vehicle in the corridor
+        self.results = None
+        # streaming summaries: travel time, wait per intersection, and the
+        # time-weighted number of cars waiting at each intersection
+        self.travel = Summary()
+        self.wait_stats = dict((i, Summary((0.5, 0.9))) for i in route)
+        self.queue_lengths = dict((i, TimeWeighted()) for i in route)
+
+        # indexed by event type
+        self.handlers = [self.arrival, self.cross, self.departure]
+
+    # Interval between arrivals averaging mean seconds (5)
+    def random_exp(self, mean):
+        return self.random.expovariate(1/mean)
+
+    def schedule(self, time, event_type, vehicle_id, to_cross, start):
+        self.queue.push((time, next(self.seq), event_type, vehicle_id, to_cross, start))
+
+    #Event Handlers:
+
+    def arrival(self, curr_vehicle, curr_inter, og): #to some intersection
+        now = self.now
+        if debug:
+            print("Arrival Event: time = {0}".format(now))
+            print("Vehicle ID: {0}".format(curr_vehicle))
+        #if interesection is free, car will enter, else it will wait
+
+        #if light at 10th street intersection is green, car will enter, else it will wait
+        g,y,r = signal_time_NB[curr_inter] #signal times for 10th st light
+        signal_cycle = g+y+r
+
+        self.arrivalCounts[curr_inter] += 1
+
+        wait =  0
+        if ((now % signal_cycle) > (g+y)): #arrived when red light
+            wait = r - ((now % signal_cycle) - (g+y) )
+            self.waiting_counts[curr_inter] = self.waiting_counts[curr_inter] + 1
+            if self.stats:
+                self.queue_lengths[curr_inter].update(now, self.waiting_counts[curr_inter])
+
+        if curr_inter == 10:
+            self.waits[curr_vehicle] = [0.0] * len(route)
+            self.ArrivalCount = self.ArrivalCount + 1
+            if self.ArrivalCount < self.Cutoff:
+                ts = now + self.random_exp(self.A)
+                self.schedule(ts, ARRIVAL, curr_vehicle + 1, 10, ts)
+
+        add = 0
+        if self.waiting_counts[curr_inter] > 1: #if more than one car
+            add = intersection_x_times[curr_inter]/2 #wait till previous car is halfway through intersection
+        next_ts = now + wait + add
+        self.waits[curr_vehicle][route_index[curr_inter]] = wait + add
+        if self.stats:
+            self.wait_stats[curr_inter].add(wait + add)
+        #still need to cross the same intersection
+        self.schedule(next_ts, CROSS, curr_vehicle, curr_inter, og)
+
+    def cross(self, curr_vehicle, curr_inter, og):
+        if debug:
+            print("Crossing Event: time = {0}".format(self.now))
+            print("Vehicle ID: {0}".format(curr_vehicle))
+
+        self.crossCounts[curr_inter] += 1
+        if self.waiting_counts[curr_inter] > 0:
+            self.waiting_counts[curr_inter] = self.waiting_counts[curr_inter] - 1
+            if self.stats:
+                self.queue_lengths[curr_inter].update(self.now, self.waiting_counts[curr_inter])
+
+        #Schedule departure event
+        ts = self.now + intersection_x_times[curr_inter]
+        self.schedule(ts, DEPARTURE, curr_vehicle, curr_inter, og)
+
+    def departure(self, curr_vehicle, curr_inter, og):
+        if debug:
+            print("Departure Event: time = {0}".format(self.now))
+            print("Vehicle ID: {0}".format(curr_vehicle))
+
+        self.depCounts[curr_inter] += 1
+        if curr_inter < 13: #schedule arrival to next intersection
+            next_inter = curr_inter + 1
+            if curr_inter == 12:
+                next_inter = next_inter + 1
+            next_ts = self.now + section_traverse_times[(curr_inter, next_inter)]
+            self.schedule(next_ts, ARRIVAL, curr_vehicle, next_inter, og)
+        else: #end of all scheduling
+            vehicle_travel = self.now - og
+            self.TotalTravel = self.TotalTravel + vehicle_travel
+            if self.stats:
+                self.travel.add(vehicle_travel)
+            waits = self.waits.pop(curr_vehicle)
+            if self.results is not None:
+                self.results.record(curr_vehicle, og, self.now, waits)
+
+    def run_sim(self):
+        q = self.queue
+        pop = q.pop
+        handlers = self.handlers
+        events = 0
+        while(q):
+            now, seq, event_type, vehicle_id, to_cross, start = pop()
+            self.now = now
+            #call event handler relative to the event type
+            handlers[event_type](vehicle_id, to_cross, start)
+            events += 1
+        self.events += events
+
+    def run(self):
+        """Schedule the first arrival and process events until the FEL is empty"""
+        ts = self.random_exp(self.A)
+        self.schedule(ts, ARRIVAL, 0, 10, ts) #Needs to have previous intersection
+        if self.record:
+            with ResultSink(self.filename, route) as self.results:
+                self.run_sim()
+        else:
+            self.run_sim()
+        return self
+
+    def average_travel(self):
+        return self.TotalTravel/self.Cutoff
+
+    def report(self):
+        """Summaries of the run so far: travel time, and per intersection the wait and mean queue"""
+        if not self.stats:
+            return None
+        return {"travel": self.travel.report(),
+                "wait": dict((i, self.wait_stats[i].report()) for i in route),
+                "queue": dict((i, self.queue_lengths[i].mean(self.now)) for i in route)}
 
 
 def main():
-    global A
-    global TotalTravel
-    global ArrivalCount
-
-
-    TotalTravel = 0
-    waiting_counts = {10:0, 11:0, 12:0, 13:0, 14:0}
-    waiting_time = {10:0, 11:0, 12:0, 13:0, 14:0}
-    pq = [] #priority queue fo FEL
-    ts = random_exp(A)
-    data = {"vehicle_id": 0,  "type": "arrival", "next":10, "start":ts, "latest":ts} #Needs to have previous intersection
-    new_event = Event(ts, data)
-    schedule(pq, ts, new_event)
+    parser = argparse.ArgumentParser(description="Event-oriented model of the Peachtree corridor")
+    parser.add_argument("cars", nargs="?", type=int, default=Cutoff,
+                        help="number of cars, e.g. 1000000 to measure event throughput")
+    parser.add_argument("fel", nargs="?", default="heap", choices=sorted(backends),
+                        help="future event list implementation")
+    parser.add_argument("output", nargs="?", default=None,
+                        help="per-vehicle results, CSV or columnar (.crd)")
+    parser.add_argument("--no-record", dest="record", action="store_false",
+                        help="write no per-vehicle results, only the summary")
+    parser.add_argument("--no-stats", dest="stats", action="store_false",
+                        help="skip the streaming travel, wait and queue statistics")
+    args = parser.parse_args()
+    sim = Simulation(A, args.cars, filename=args.output, fel=args.fel, record=args.record, stats=args.stats)
+    print("running")
     start = time.time()
-    run_sim(pq)
+    sim.run()
     end = time.time()
-    print "==Statistics=="
-    print A
-    print "Total Travel Time = {0}".format(TotalTravel)
-    print "Average Travel Time = {0}".format(TotalTravel/Cutoff)
-
-
-
-main()
+    print("==Statistics==")
+    print(sim.A)
+    print("Total Travel Time = {0}".format(sim.TotalTravel))
+    print("Average Travel Time = {0}".format(sim.average_travel()))
+    report = sim.report()
+    if report is not None:
+        travel = report["travel"]
+        print("Travel Time: mean {mean:.2f}, std {std:.2f}, min {min:.2f}, median {p50:.2f}, 90% {p90:.2f}, 99% {p99:.2f}, max {max:.2f}".format(**travel))
+        for i in route:
+            wait = report["wait"][i]
+            print("Intersection {0}: wait mean {1:.2f}, 90% {2:.2f}, max {3:.2f}; cars waiting on average {4:.3f}".format(
+                i, wait["mean"], wait["p90"], wait["max"], report["queue"][i]))
+    print("Events = {0} in {1:.1f}s ({2:.0f} events/s)".format(sim.events, end - start, sim.events / max(end - start, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
 # print arrivalCounts
 # print crossCounts
 # print depCounts
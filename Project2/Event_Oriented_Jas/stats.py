@@ -0,0 +1,152 @@
+"""Streaming statistics for the corridor simulations.
+
+Each accumulator takes observations one at a time in O(1) time and keeps
+O(1) memory, so the event handlers can update them as the run goes and a
+run of any length reports its distributions without per-vehicle storage:
+
+    Welford        count, mean, variance, min and max (Welford's update)
+    P2Quantile     one quantile estimated with the P-squared algorithm
+                   (Jain and Chlamtac, CACM 1985), from five markers
+    Summary        a Welford plus a P2Quantile per requested quantile
+    TimeWeighted   the time average of a piecewise constant quantity,
+                   e.g. the number of cars waiting at an intersection
+"""
+from __future__ import division
+from bisect import bisect_right
+import math
+
+class Welford(object):
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = float("inf")
+        self.max = -self.min
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def variance(self):
+        """Sample variance (n - 1 in the denominator)"""
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+class P2Quantile(object):
+    """Estimate of the p quantile, 0 < p < 1.
+
+    Five markers track the minimum, the p/2, p and (1+p)/2 quantiles and
+    the maximum; after each observation the middle three are moved
+    towards their desired positions with a piecewise parabolic fit.
+    Exact for the first five observations.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        # desired positions of the middle markers after the fifth observation,
+        # and how much they move with each observation after that
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        steps = self.count - 5
+        desired, increments = self.desired, self.increments
+        for i in (1, 2, 3):
+            d = desired[i] + steps * increments[i] - n[i]
+            if d >= 1:
+                if n[i + 1] - n[i] > 1:
+                    self._adjust(i, 1)
+            elif d <= -1 and n[i - 1] - n[i] < -1:
+                self._adjust(i, -1)
+
+    def _adjust(self, i, d):
+        """Move marker i one position in direction d, and its height with it"""
+        q, n = self.heights, self.positions
+        h = q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+        if not q[i - 1] < h < q[i + 1]:
+            # parabola overshoots a neighbor: fall back to linear
+            h = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+        q[i] = h
+        n[i] += d
+
+    def value(self):
+        if self.count > 5:
+            return self.heights[2]
+        if not self.heights:
+            return float("nan")
+        return self.heights[int(round(self.p * (len(self.heights) - 1)))]
+
+class Summary(object):
+    """Moments and quantiles of a stream of observations"""
+
+    def __init__(self, quantiles=(0.5, 0.9, 0.99)):
+        self.moments = Welford()
+        self.quantiles = [P2Quantile(p) for p in quantiles]
+
+    def add(self, x):
+        self.moments.add(x)
+        for q in self.quantiles:
+            q.add(x)
+
+    def report(self):
+        m = self.moments
+        report = {"count": m.count, "mean": m.mean, "std": m.std(), "min": m.min, "max": m.max}
+        for q in self.quantiles:
+            report["p{0:g}".format(100 * q.p)] = q.value()
+        return report
+
+class TimeWeighted(object):
+    """Time average of a value that changes by steps, starting at `value` at time `start`"""
+
+    def __init__(self, value=0, start=0.0):
+        self.value = value
+        self.start = start
+        self.last = start
+        self.area = 0.0
+        self.max = value
+
+    def update(self, now, value):
+        """The value changed to `value` at time `now`"""
+        self.area += self.value * (now - self.last)
+        self.last = now
+        self.value = value
+        if value > self.max:
+            self.max = value
+
+    def mean(self, now=None):
+        """Average from the start until now (by default the last change)"""
+        if now is None:
+            now = self.last
+        area = self.area + self.value * (now - self.last)
+        return area / (now - self.start) if now > self.start else float(self.value)